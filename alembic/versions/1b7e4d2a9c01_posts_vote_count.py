@@ -0,0 +1,29 @@
+"""posts vote_count
+
+Revision ID: 1b7e4d2a9c01
+Revises: fcab9b67fb00
+Create Date: 2026-10-18 10:12:41.318270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7e4d2a9c01'
+down_revision: Union[str, Sequence[str], None] = 'fcab9b67fb00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("posts", sa.Column("vote_count", sa.Integer(), nullable=False, server_default=sa.text("0")))
+    op.execute("UPDATE posts SET vote_count = (SELECT count(*) FROM votes WHERE votes.post_id = posts.id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("posts", "vote_count")
@@ -0,0 +1,34 @@
+"""posts keyset index
+
+Revision ID: 6d3f8a0e5b27
+Revises: 1b7e4d2a9c01
+Create Date: 2026-10-18 11:02:07.544913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d3f8a0e5b27'
+down_revision: Union[str, Sequence[str], None] = '1b7e4d2a9c01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction, and keeps posts writable while the index builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_account_id_created_at_id", "posts", ["account_id", "created_at", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_posts_account_id_created_at_id", table_name="posts", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,39 @@
+"""posts search vector
+
+Revision ID: 9a2c51e7d4b8
+Revises: 6d3f8a0e5b27
+Create Date: 2026-10-18 11:47:55.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a2c51e7d4b8'
+down_revision: Union[str, Sequence[str], None] = '6d3f8a0e5b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(text, ''))) STORED"
+    )
+    # Built concurrently, outside the migration's transaction, so posts stay writable meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_search_vector", "posts", ["search_vector"], postgresql_using="gin",
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_posts_search_vector", table_name="posts", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("posts", "search_vector")
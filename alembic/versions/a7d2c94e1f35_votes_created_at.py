@@ -0,0 +1,35 @@
+"""votes created_at
+
+Revision ID: a7d2c94e1f35
+Revises: f1c3a8e6b902
+Create Date: 2026-10-18 23:41:07.255914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2c94e1f35'
+down_revision: Union[str, Sequence[str], None] = 'f1c3a8e6b902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("votes", sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False))
+    # Existing votes count as cast when their post was created, as f1c3a8e6b902 scored them; rescore
+    # so that removing one takes off exactly what it weighs now (default 24h half-life, as there)
+    op.execute("UPDATE votes SET created_at = posts.created_at FROM posts WHERE posts.id = votes.post_id")
+    op.execute(
+        "UPDATE trending_scores SET score = base + ln(1 + "
+        "(SELECT count(*) FROM votes WHERE votes.post_id = trending_scores.post_id))"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("votes", "created_at")
@@ -0,0 +1,30 @@
+"""row versions
+
+Revision ID: c83e0f4d1a62
+Revises: 9a2c51e7d4b8
+Create Date: 2026-10-18 14:02:31.417806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c83e0f4d1a62'
+down_revision: Union[str, Sequence[str], None] = '9a2c51e7d4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("posts", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    op.add_column("users", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "version")
+    op.drop_column("posts", "version")
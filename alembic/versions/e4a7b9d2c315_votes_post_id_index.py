@@ -0,0 +1,33 @@
+"""votes post_id index
+
+Revision ID: e4a7b9d2c315
+Revises: c83e0f4d1a62
+Create Date: 2026-10-18 20:31:12.590344
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7b9d2c315'
+down_revision: Union[str, Sequence[str], None] = 'c83e0f4d1a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction, and keeps votes writable while the index builds.
+    # posts(account_id, created_at, id) already exists (6d3f8a0e5b27, also built concurrently) and serves
+    # account_id filters and created_at ordering, so votes.post_id is the only missing index.
+    with op.get_context().autocommit_block():
+        op.create_index("ix_votes_post_id", "votes", ["post_id"], postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_votes_post_id", table_name="votes", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,41 @@
+"""trending scores
+
+Revision ID: f1c3a8e6b902
+Revises: e4a7b9d2c315
+Create Date: 2026-10-18 21:05:12.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a8e6b902'
+down_revision: Union[str, Sequence[str], None] = 'e4a7b9d2c315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "trending_scores",
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("base", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_trending_scores_score_post_id", "trending_scores", ["score", "post_id"])
+    # Same scores as app.trending.rebuild with the default 24h half-life, counted from 2024-01-01 UTC
+    op.execute(
+        "INSERT INTO trending_scores (post_id, score, base) "
+        "SELECT id, base + ln(1 + vote_count), base FROM "
+        "(SELECT id, vote_count, (EXTRACT(EPOCH FROM created_at) - 1704067200) * ln(2) / 86400 AS base FROM posts) AS p"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_trending_scores_score_post_id", table_name="trending_scores")
+    op.drop_table("trending_scores")
@@ -1,16 +1,22 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
 import logging
+import time
+import uuid
 
 from fastapi import APIRouter, Depends, status, HTTPException, Response, Request
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from jose import ExpiredSignatureError, JWTError, jwt
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
+from .database import get_async_db, get_read_db
 from .models import UsersTable
-from . import hash_verify, schemas
+from . import hash_verify, rate_limit, revocation, schemas
 from .config import settings
+from .cache import TTLCache
+from .metrics import JWT_DECODE_FAILURES
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -19,21 +25,64 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 router = APIRouter(prefix="", tags=["Authentication"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
-def get_current_user_id(request: Request,token: Optional[str] = Depends(oauth2_scheme),db: Session = Depends(get_db),):
+# user id -> detached UsersTable row; saves the users lookup on every authenticated request
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+# sha256(token) -> (user_id, exp, jti); saves re-verifying the signature of a token we already accepted
+token_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+
+@event.listens_for(UsersTable, "after_update")
+@event.listens_for(UsersTable, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target):
+    # ORM flushes only; bulk UPDATE/DELETE statements on users must call invalidate_user() themselves
+    invalidate_user(target.id)
+
+
+def _failure_reason(error: JWTError) -> str:
+    return "expired" if isinstance(error, ExpiredSignatureError) else "invalid"
+
+
+def _decode_user_id(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(digest)
+    if cached and cached[1] > time.time():
+        user_id, _, jti = cached
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: int = payload.get("user_id")
+            jti = payload.get("jti")
+        except JWTError as e:
+            JWT_DECODE_FAILURES.labels("access", _failure_reason(e)).inc()
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.set(digest, (user_id, payload.get("exp", 0), jti))
+
+    # Checked on cache hits too: a token can be revoked after we first accepted it
+    if revocation.is_revoked(jti):
+        JWT_DECODE_FAILURES.labels("access", "revoked").inc()
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return user_id
+
+
+async def get_current_user_id(request: Request,token: Optional[str] = Depends(oauth2_scheme),db: AsyncSession = Depends(get_read_db),):
     cookie_token = request.cookies.get("access_token")
     final_token = cookie_token or token
     if not final_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    try:
-        payload = jwt.decode(final_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-    except JWTError as e:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = _decode_user_id(final_token)
 
-    user = db.query(UsersTable).filter(UsersTable.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.get(UsersTable, user_id)
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        db.expunge(user)
+        user_cache.set(user_id, user)
 
     return user
 
@@ -41,23 +90,28 @@ def get_current_user_id(request: Request,token: Optional[str] = Depends(oauth2_s
 def create_access_token(data: dict) -> str:
     payload = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    payload.update({"exp": expire, "type": "access"})
+    payload.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def create_refresh_token(data: dict) -> str:
     payload = data.copy()
     expire = datetime.utcnow() + timedelta(days=7)
-    payload.update({"exp": expire, "type": "refresh"})
+    payload.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-@router.post("/login", response_model=schemas.Token)
-def login(response: Response,user_credentials: OAuth2PasswordRequestForm = Depends(),db: Session = Depends(get_db),):
-    user = db.query(UsersTable).filter(UsersTable.email == user_credentials.username).first()
-    if not user or not hash_verify.verify(user_credentials.password, user.password):
+@router.post("/login", response_model=schemas.Token, dependencies=[Depends(rate_limit.limit("login", settings.RATE_LIMIT_LOGIN))])
+async def login(response: Response,user_credentials: OAuth2PasswordRequestForm = Depends(),db: AsyncSession = Depends(get_async_db),):
+    user = await db.scalar(select(UsersTable).filter(UsersTable.email == user_credentials.username))
+    if not user or not await hash_verify.verify_async(user_credentials.password, user.password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid credentials")
 
+    if hash_verify.needs_update(user.password):
+        # Argon2 cost settings changed since this hash was made; upgrade it while we have the plain password
+        user.password = await hash_verify.hash_async(user_credentials.password)
+        await db.commit()
+
     access_token = create_access_token(data={"user_id": user.id})
     refresh_token = create_refresh_token(data={"user_id": user.id})
 
@@ -68,7 +122,7 @@ def login(response: Response,user_credentials: OAuth2PasswordRequestForm = Depen
 
 
 @router.post("/refresh")
-def refresh_token(response: Response, request: Request, db: Session = Depends(get_db)):
+async def refresh_token(response: Response, request: Request, db: AsyncSession = Depends(get_async_db)):
     refresh_token = request.cookies.get("refresh_token")
     if not refresh_token:
         raise HTTPException(status_code=401, detail="No refresh token")
@@ -77,23 +131,41 @@ def refresh_token(response: Response, request: Request, db: Session = Depends(ge
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
         if payload.get("type") != "refresh":
             raise HTTPException(status_code=401, detail="Invalid token type")
+        if revocation.is_revoked(payload.get("jti")):
+            JWT_DECODE_FAILURES.labels("refresh", "revoked").inc()
+            raise HTTPException(status_code=401, detail="Token revoked")
 
         user_id = payload.get("user_id")
-        user = db.query(UsersTable).filter(UsersTable.id == user_id).first()
+        user = await db.get(UsersTable, user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
 
+        # Rotate: the presented refresh token is single use, so a stolen copy dies at the next refresh
+        await revocation.revoke(payload.get("jti"), payload["exp"])
         new_access_token = create_access_token(data={"user_id": user.id})
+        new_refresh_token = create_refresh_token(data={"user_id": user.id})
         response.set_cookie( key="access_token", value=new_access_token, httponly=True, secure=False, samesite="lax", max_age=ACCESS_TOKEN_EXPIRE_MINUTES * 60, path="/",        )
+        response.set_cookie( key="refresh_token", value=new_refresh_token, httponly=True, secure=False, samesite="lax", max_age=7 * 24 * 60 * 60, path="/",)
         
         return {"access_token": new_access_token, "token_type": "bearer"}
     
-    except JWTError:
+    except JWTError as e:
+        JWT_DECODE_FAILURES.labels("refresh", _failure_reason(e)).inc()
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
 
 @router.post("/logout")
-def logout(response: Response):
+async def logout(response: Response, request: Request, token: Optional[str] = Depends(oauth2_scheme)):
+    # Revoke whatever tokens came with the request; expired or garbled ones need no revoking
+    for presented in (request.cookies.get("access_token") or token, request.cookies.get("refresh_token")):
+        if not presented:
+            continue
+        try:
+            payload = jwt.decode(presented, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            continue
+        await revocation.revoke(payload.get("jti"), payload.get("exp", 0))
+
     response.delete_cookie(key="access_token", path="/")
     response.delete_cookie(key="refresh_token", path="/")
     return {"message": "Logged out successfully"}
@@ -101,5 +173,5 @@ def logout(response: Response):
 
 
 @router.get("/me", response_model=schemas.UserBase)
-def get_current_user(current_user: UsersTable = Depends(get_current_user_id)):
+async def get_current_user(current_user: UsersTable = Depends(get_current_user_id)):
     return current_user
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""Key-value stores shared by all gunicorn workers.
+
+Redis (``redis://``) for deployments, a SQLite file (``sqlite:///``) for a
+single host and for tests. Both offer the same plain operations; anything that
+must read and write atomically is written once per store by its caller, as a
+Lua script for ``RedisBackend.eval`` and as a function of the sqlite3
+connection for ``SQLiteBackend.transaction``.
+
+Used by the shared post cache, the shared rate limits and revocation sync.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # only needed when a redis:// URL is configured
+
+        self.client = redis.from_url(url)
+
+    async def get_many(self, keys):
+        return await self.client.mget(keys)
+
+    async def set(self, key, value: bytes, ttl: float | None):
+        await self.client.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    async def add(self, key, value: bytes, ttl: float) -> bool:
+        return bool(await self.client.set(key, value, px=int(ttl * 1000), nx=True))
+
+    async def delete(self, key):
+        await self.client.delete(key)
+
+    async def incr(self, key) -> int:
+        return await self.client.incr(key)
+
+    async def eval(self, script: str, keys, *args):
+        return await self.client.eval(script, len(keys), *keys, *args)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class SQLiteBackend:
+    """Same operations on a SQLite file; WAL mode lets every worker on the host use it.
+
+    Everything lives in one table, ``cache (key, value, expires_at)``; a NULL
+    expires_at never expires.
+    """
+
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        self._sets = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def _run(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def get_many(self, keys):
+        rows = await asyncio.to_thread(
+            self._run,
+            f"SELECT key, value FROM cache WHERE key IN ({', '.join('?' * len(keys))})"
+            " AND (expires_at IS NULL OR expires_at > ?)",
+            (*keys, time.time()),
+        )
+        found = {key: value if isinstance(value, bytes) else str(value).encode() for key, value in rows}
+        return [found.get(key) for key in keys]
+
+    async def set(self, key, value: bytes, ttl: float | None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        await asyncio.to_thread(
+            self._run, "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+        )
+        self._sets += 1
+        if self._sets % self._PURGE_EVERY == 0:
+            await asyncio.to_thread(self._run, "DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    async def add(self, key, value: bytes, ttl: float) -> bool:
+        now = time.time()
+        rows = await asyncio.to_thread(
+            self._run,
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE cache.expires_at <= ? RETURNING key",
+            (key, value, now + ttl, now),
+        )
+        return bool(rows)
+
+    async def delete(self, key):
+        await asyncio.to_thread(self._run, "DELETE FROM cache WHERE key = ?", (key,))
+
+    async def incr(self, key) -> int:
+        rows = await asyncio.to_thread(
+            self._run,
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, 1, NULL)"
+            " ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value",
+            (key,),
+        )
+        return rows[0][0]
+
+    def _transaction(self, fn, args):
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers cannot interleave between fn's reads and writes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn, *args)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    async def transaction(self, fn, *args):
+        """Run ``fn(connection, *args)`` in one write transaction and return its result."""
+        return await asyncio.to_thread(self._transaction, fn, args)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def backend_from_url(url: str):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url.removeprefix("sqlite:///"))
+    raise ValueError(f"unsupported backend URL: {url}")
@@ -9,6 +9,51 @@ class Settings(BaseSettings):
     SECRET_KEY : str 
     ALGORITHM : str 
     ACCESS_TOKEN_EXPIRE_MINUTES : int
+    USER_CACHE_SIZE : int = 10000
+    USER_CACHE_TTL_SECONDS : float = 60
+    ARGON2_TIME_COST : int = 3
+    ARGON2_MEMORY_COST : int = 65536  # KiB
+    ARGON2_PARALLELISM : int = 4
+    HASH_POOL_SIZE : int = 2
+    HASH_QUEUE_LIMIT : int = 32
+    CACHE_PURGE_URL : str = ""  # e.g. http://frontend/purge; empty disables nginx cache purges
+    SHARED_CACHE_URL : str = ""  # redis://host:6379/0 or sqlite:///path/cache.db; empty disables the cross-worker post cache
+    SHARED_CACHE_TTL_SECONDS : float = 30
+    SHARED_CACHE_LOCK_SECONDS : float = 5  # how long other workers wait for the one filling a missed entry
+    REVOCATION_CAPACITY : int = 100000  # revoked, unexpired tokens the Bloom filter is sized for; it grows past that
+    REVOCATION_SYNC_URL : str = ""  # redis:// or sqlite:/// shared by all workers; empty keeps revocations per worker
+    REVOCATION_SYNC_SECONDS : float = 1  # how often workers pull revocations made elsewhere
+    RATE_LIMIT_URL : str = ""  # redis:// or sqlite:/// shared by all workers; empty limits each worker on its own
+    RATE_LIMIT_LOGIN : str = "10/minute"  # per client IP; each attempt costs an Argon2 verify. Empty disables a limit
+    RATE_LIMIT_POST_READS : str = "300/minute"  # per user, GET /posts and /posts/{id}
+    RATE_LIMIT_POST_WRITES : str = "30/minute"  # per user, POST /posts and /posts/import
+    RATE_LIMIT_VOTES : str = "120/minute"  # per user, POST /votes and /votes/batch
+    TRENDING_HALF_LIFE_HOURS : float = 24  # a vote's weight halves this often; rescore with python -m app.trending after changing it
+    FAST_POST_LISTS : bool = False  # GET /posts: encode plain rows with orjson, skipping response_model validation
+    EXPORT_BATCH_SIZE : int = 1000  # rows per fetch from the server-side cursor in GET /posts/export
+    IMPORT_CHUNK_SIZE : int = 5000  # rows per COPY / INSERT transaction in POST /posts/import
+    IMPORT_MAX_ERRORS : int = 100
+    VOTE_BATCH_MAX_SIZE : int = 500
+    VOTE_WRITE_BEHIND : bool = False  # acknowledge votes at once and write them in coalesced batches; nginx's cached /posts/{id} then keeps the old count until it expires (proxy_cache_valid, 10s)
+    VOTE_BUFFER_MAX_SIZE : int = 1000
+    VOTE_BUFFER_FLUSH_SECONDS : float = 0.5
+    VOTE_BUFFER_MAX_PENDING : int = 10000  # beyond this, votes are written synchronously
+    VOTE_BUFFER_MAX_RETRIES : int = 5  # failed flushes before a vote is dropped
+    SLOW_QUERY_MS : float = 500  # log statements slower than this; 0 disables
+    SLOW_QUERY_EXPLAIN : bool = False  # also log EXPLAIN ANALYZE of slow SELECTs (runs them a second time)
+    SQL_DEBUG_HEADER : bool = False  # Server-Timing header with the statement count and DB time of each request
+    DB_POOL_SIZE : int = 5  # per engine, per gunicorn worker
+    DB_MAX_OVERFLOW : int = 10
+    DB_POOL_TIMEOUT : float = 30
+    DB_POOL_PRE_PING : bool = False
+    DB_POOL_RECYCLE : int = -1
+    DB_STATEMENT_TIMEOUT_MS : int = 0  # 0 = server default
+    DB_PGBOUNCER : bool = False  # NullPool, no cached prepared statements; set statement_timeout on the role instead
+    DB_REPLICA_URLS : str = ""  # comma-separated postgresql:// URLs of read replicas; empty sends every read to the primary
+    DB_REPLICA_BALANCE : str = "round_robin"  # or "least_connections"
+    DB_REPLICA_MAX_LAG_SECONDS : float = 5  # replicas further behind than this are skipped
+    DB_REPLICA_CHECK_SECONDS : float = 5  # how often replica health and lag are measured
+    DB_STICKY_SECONDS : float = 10  # after a client's write, its reads go to the primary for this long
 
 
     class Config:
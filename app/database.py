@@ -1,9 +1,21 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+from threading import Lock
+from uuid import uuid4
+import asyncio
+import logging
+import time
+
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from app.config import settings
 import os
 
+logger = logging.getLogger(__name__)
 
 DATABASE_HOST = os.getenv("DATABASE_HOST", "postgres")
 DATABASE_PORT = os.getenv("DATABASE_PORT", "5432")
@@ -12,11 +24,100 @@ DATABASE_USER = os.getenv("DATABASE_USERNAME", "postgres")
 DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
 
 DATABASE_URL = f"postgresql://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.DATABASE_USERNAME}:{settings.DATABASE_PASSWORD}@{settings.DATABASE_HOSTNAME}:{settings.DATABASE_PORT}/{settings.DATABASE_NAME}"
+
+
+class _CheckoutTimingMixin:
+    """Records how long callers wait to get a connection out of the pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = {"checkouts": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+        self._stats_lock = Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                stats = self.checkout_stats
+                stats["checkouts"] += 1
+                stats["timeouts"] += timed_out
+                stats["wait_total"] += waited
+                stats["wait_max"] = max(stats["wait_max"], waited)
+
+
+class TimedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class TimedNullPool(_CheckoutTimingMixin, NullPool):
+    pass
+
+
+def engine_options(is_async: bool) -> dict:
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE}
+    connect_args = {}
+
+    if settings.DB_PGBOUNCER:
+        # PgBouncer owns the pooling; in transaction mode a server connection may change between
+        # statements, so asyncpg must not rely on (or reuse names of) server-side prepared statements
+        options["poolclass"] = TimedNullPool
+        if is_async:
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+            )
+    else:
+        options.update(
+            poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            if is_async:
+                connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    options["connect_args"] = connect_args
+    return options
 
-engine = create_engine(DATABASE_URL)
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    checkout_stats = dict(getattr(pool, "checkout_stats", {}))
+    if checkout_stats.get("checkouts"):
+        checkout_stats["wait_avg"] = checkout_stats["wait_total"] / checkout_stats["checkouts"]
+    stats.update(checkout_stats)
+    return stats
+
+
+# Sync engine: alembic, CLI maintenance commands (app.reconcile)
+engine = create_engine(DATABASE_URL, **engine_options(is_async=False))
 
 session_local = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 
+# Async engine: every request handler. Concurrency per worker is bounded by this pool, not a threadpool.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(is_async=True))
+
+async_session_local = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -24,4 +125,168 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with async_session_local() as db:
+        yield db
+
+
+# How far a replica is behind; 0 once it has replayed everything it received
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    def __init__(self, url: str, **options):
+        self.engine = create_async_engine(url, **(options or engine_options(is_async=True)))
+        self.session_local = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+        self.lag = 0.0
+        self.in_use = 0
+        self.reads = 0
+
+    async def check(self):
+        try:
+            async with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = await conn.scalar(_REPLICA_LAG_SQL)
+                    self.lag = float("inf") if lag is None else float(lag)  # nothing replayed yet
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            self.healthy = True
+        except Exception:
+            if self.healthy:
+                logger.exception("replica %s failed its health check", self.engine.url.render_as_string(hide_password=True))
+            self.healthy = False
+
+    def stats(self) -> dict:
+        return {
+            "url": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "in_use": self.in_use,
+            "reads": self.reads,
+            **pool_stats(self.engine),
+        }
+
+
+class ReplicaRouter:
+    """Picks the replica for a read; None means use the primary (no replica usable)."""
+
+    def __init__(self, urls: list[str], balance: str, max_lag: float, check_interval: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.balance = balance
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.fallbacks = 0
+        self._next = 0
+        self._timer = None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self) -> Replica | None:
+        usable = [replica for replica in self.replicas if replica.healthy and replica.lag <= self.max_lag]
+        if not usable:
+            self.fallbacks += 1
+            return None
+        self._next += 1
+        start = self._next % len(usable)
+        if self.balance == "least_connections":
+            # Rotating first spreads ties instead of always picking the first idle replica
+            return min(usable[start:] + usable[:start], key=lambda replica: replica.in_use)
+        return usable[start]
+
+    async def check(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _run_timer(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        if self.replicas and self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {"balance": self.balance, "fallbacks": self.fallbacks, "replicas": [replica.stats() for replica in self.replicas]}
+
+
+def _replica_url(url: str) -> str:
+    url = url.strip()
+    return "postgresql+asyncpg://" + url[len("postgresql://"):] if url.startswith("postgresql://") else url
+
+
+replicas = ReplicaRouter(
+    [_replica_url(url) for url in settings.DB_REPLICA_URLS.split(",") if url.strip()],
+    balance=settings.DB_REPLICA_BALANCE,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DB_REPLICA_CHECK_SECONDS,
+)
+
+# Read-your-writes: a client that just wrote reads from the primary until this cookie expires
+STICKY_COOKIE = "db_primary"
+
+# Set by ReadYourWritesMiddleware for the duration of a request; flipped by any commit made while handling it
+_request_wrote: ContextVar[list | None] = ContextVar("request_wrote", default=None)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_request_wrote(session):
+    wrote = _request_wrote.get()
+    if wrote is not None:
+        wrote[0] = True
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas:
+            return await self.app(scope, receive, send)
+
+        wrote = [False]
+        token = _request_wrote.set(wrote)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and wrote[0]:
+                cookie = f"{STICKY_COOKIE}=1; Max-Age={int(settings.DB_STICKY_SECONDS)}; Path=/; HttpOnly; SameSite=lax"
+                message.setdefault("headers", []).append((b"set-cookie", cookie.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_wrote.reset(token)
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Session for read-only handlers: a replica when one is usable, else the request's primary session."""
+    replica = None if request.cookies.get(STICKY_COOKIE) else replicas.choose()
+    if replica is None:
+        yield db
+        return
+
+    replica.in_use += 1
+    replica.reads += 1
+    try:
+        async with replica.session_local() as replica_db:
+            yield replica_db
+    except OperationalError:
+        replica.healthy = False  # skipped until its next health check passes
+        raise
+    finally:
+        replica.in_use -= 1
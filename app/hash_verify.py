@@ -1,10 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import time
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from .config import settings
+from .metrics import ARGON2_SECONDS
+
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated = "auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated = "auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
 
 def hash(password : str):
     return pwd_context.hash(password)
 
 def verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+def needs_update(hashed_password):
+    # True when the hash was made with cost parameters other than the configured ones
+    return pwd_context.needs_update(hashed_password)
+
+
+# Argon2 is CPU-bound and holds the GIL, so request handlers run it in a small
+# dedicated process pool. Calls beyond HASH_QUEUE_LIMIT (running + waiting, per
+# worker) are turned away with a 503 instead of queueing behind a login burst.
+# The pool starts on the first login, when the worker already runs threads
+# (anyio, aiosqlite); forking it then could copy a lock another thread holds,
+# so the pool's processes come from a forkserver (spawn where there is none).
+_pool = None
+_pending = 0
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.HASH_POOL_SIZE, mp_context=multiprocessing.get_context(_START_METHOD))
+    return _pool
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= settings.HASH_QUEUE_LIMIT:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+    _pending += 1
+    start = time.perf_counter()
+    try:
+        executor = _get_pool() if settings.HASH_POOL_SIZE > 0 else None  # 0 falls back to the threadpool
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        _pending -= 1
+        ARGON2_SECONDS.labels(fn.__name__).observe(time.perf_counter() - start)
+
+async def hash_async(password : str):
+    return await _run(hash, password)
+
+async def verify_async(plain_password, hashed_password):
+    return await _run(verify, plain_password, hashed_password)
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,53 @@
+"""Conditional GET support and nginx proxy_cache refresh.
+
+Single posts and users carry a strong ETag built from the row version (plus the
+vote count for posts), so a client or nginx revalidating with If-None-Match gets
+a 304 after one cheap lookup instead of the full query and body.
+"""
+import logging
+
+import httpx
+from fastapi import Response, status
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+POST_CACHE_CONTROL = "private, no-cache"  # per-user data: browsers must revalidate every time
+USER_CACHE_CONTROL = "public, max-age=60"
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+async def purge(request_headers, *paths: str):
+    """Have nginx replace its cached copy of ``paths`` (see the /purge/ location in nginx.conf).
+
+    Cached entries are keyed per credential, so the refresh is sent with the
+    credentials of the request that made the change. Entries held under other
+    credentials expire on their own (proxy_cache_valid) and then revalidate.
+    """
+    if not settings.CACHE_PURGE_URL:
+        return
+
+    headers = {name: request_headers[name] for name in ("cookie", "authorization") if name in request_headers}
+    async with httpx.AsyncClient(timeout=2) as client:
+        for path in paths:
+            try:
+                await client.get(settings.CACHE_PURGE_URL.rstrip("/") + path, headers=headers)
+            except httpx.HTTPError as e:
+                logger.warning("proxy cache purge of %s failed: %s", path, e)
@@ -1,14 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .models import Base
-from .database import engine
-from .routers import posts, users, votes
-from . import auth
+from .database import engine, async_engine, replicas, ReadYourWritesMiddleware
+from .routers import internal, posts, users, votes
+from . import auth, hash_verify, metrics, query_log, rate_limit, revocation, shared_cache
+from .config import settings
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.VOTE_WRITE_BEHIND:
+        votes.vote_buffer.start()
+    if revocation.sync is not None:
+        revocation.sync.start()
+    replicas.start()
+    yield
+    await votes.vote_buffer.close()
+    hash_verify.shutdown()
+    if shared_cache.cache is not None:
+        await shared_cache.cache.close()
+    if revocation.sync is not None:
+        await revocation.sync.close()
+    await replicas.close()
+    await rate_limit.limiter.close()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Your API",
     version="1.0.0",
-    openapi_version="3.1.0"  # ← This fixes the /docs error
+    openapi_version="3.1.0",  # ← This fixes the /docs error
+    lifespan=lifespan,
 )
 
 origins = [
@@ -25,13 +49,26 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],  
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)  # outermost, so it times CORS handling too
+
+for instrumented in (engine, async_engine.sync_engine, *(replica.engine.sync_engine for replica in replicas.replicas)):
+    metrics.instrument_engine(instrumented)
+    query_log.instrument_engine(instrumented)
 
 app.include_router(posts.router)
 app.include_router(users.router)
 app.include_router(auth.router)  # Only include once!
 app.include_router(votes.router)
+app.include_router(internal.router)
 
 
 @app.get("/")
 def root():
-    return {"message": "API is running"}
\ No newline at end of file
+    return {"message": "API is running"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
\ No newline at end of file
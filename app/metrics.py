@@ -0,0 +1,112 @@
+"""Prometheus metrics for requests, SQL, Argon2, JWT decoding and rate limits.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (an empty directory, wiped on
+restart) so every worker writes its samples there and /metrics aggregates them;
+gunicorn.conf.py cleans up after exited workers. Without it, /metrics reports
+the worker that happens to serve the scrape.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+
+from .config import settings
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled", ["method"], multiprocess_mode="livesum")
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request", ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ARGON2_SECONDS = Histogram(
+    "argon2_duration_seconds", "Argon2 hash/verify time, including the wait for a pool slot", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+JWT_DECODE_FAILURES = Counter("jwt_decode_failures_total", "Tokens rejected while decoding", ["token_type", "reason"])
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected with 429", ["limit"])
+
+
+class RequestStats:
+    __slots__ = ("scope", "statements", "sql_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+# Set by MetricsMiddleware for the duration of a request; engine events add to it
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    stats = request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+
+def instrument_engine(engine):
+    """Count statements and SQL time per request on ``engine`` (a sync Engine; pass async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status_code = 500
+        stats = RequestStats(scope)
+        token = request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SQL_DEBUG_HEADER:
+                    # SQL run so far; a streamed body may still run more
+                    timing = f'db;desc="{stats.statements} statements";dur={stats.sql_seconds * 1000:.2f}'
+                    message.setdefault("headers", []).append((b"server-timing", timing.encode()))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.labels(method).dec()
+            request_stats.reset(token)
+            # Route templates keep label cardinality bounded; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(elapsed)
+            REQUEST_SQL_STATEMENTS.labels(route).observe(stats.statements)
+            REQUEST_SQL_SECONDS.labels(route).observe(stats.sql_seconds)
+
+
+def render() -> tuple[bytes, str]:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,17 +1,30 @@
 from .database import Base
-from sqlalchemy  import Column, Integer, String, ForeignKey, func
+from sqlalchemy  import Column, Float, Integer, String, ForeignKey, Index, event, func, inspect
 from sqlalchemy.sql.sqltypes import TIMESTAMP
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 
+# SQLite's CURRENT_TIMESTAMP has no fractional part; bind values in the same
+# format so (created_at, id) keyset comparisons line up with server defaults.
+Timestamp = TIMESTAMP(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"), "sqlite"
+)
+
 class PostsTable(Base):
     __tablename__ = "posts"
 
     id = Column(Integer, autoincrement=True, primary_key=True, nullable = False)
     title = Column(String, nullable = False)
     text = Column(String, nullable = False)
-    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(Timestamp, nullable=False, server_default=func.now())
     account_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable = False)
-    account = relationship("UsersTable")
+    vote_count = Column(Integer, nullable=False, default=0, server_default="0")  # kept in sync by create_vote, repaired by app.reconcile
+    version = Column(Integer, nullable=False, server_default="1")  # part of the ETag; bumped when title/text change (see _bump_version)
+    account = relationship("UsersTable", lazy="raise")  # load explicitly (posts router: _with_account) to avoid N+1 selects
+
+    __table_args__ = (
+        Index("ix_posts_account_id_created_at_id", "account_id", "created_at", "id"),  # keyset pagination in get_posts
+    )
 
 class UsersTable(Base):
     __tablename__ = "users"
@@ -19,11 +32,41 @@ class UsersTable(Base):
     id = Column(Integer, autoincrement=True, primary_key=True, nullable = False)
     email = Column(String,nullable = False, unique = True)
     password = Column(String, nullable = False)
-    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(Timestamp, nullable=False, server_default=func.now())
+    version = Column(Integer, nullable=False, server_default="1")  # part of the ETag; bumped when email changes
+
+# Not version_id_col: that also turns on optimistic locking, and two logins rehashing the same
+# password at once would fail the second with StaleDataError. Bulk UPDATEs set version + 1 themselves.
+_VERSIONED_FIELDS = {PostsTable: ("title", "text"), UsersTable: ("email",)}
+
+
+def _bump_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _VERSIONED_FIELDS[type(target)]):
+        target.version = type(target).version + 1
+
+
+for _versioned in _VERSIONED_FIELDS:
+    event.listen(_versioned, "before_update", _bump_version)
 
 class Vote(Base):
     __tablename__ = "votes"
 
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
-    
\ No newline at end of file
+    created_at = Column(Timestamp, nullable=False, server_default=func.now())  # removing the vote takes its weight off the trending score
+
+    __table_args__ = (
+        Index("ix_votes_post_id", "post_id"),  # the PK only serves user_id lookups: vote counts, cascades from posts
+    )
+
+class TrendingScore(Base):
+    __tablename__ = "trending_scores"
+
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)  # log of the time-weighted vote total, see app.trending
+    base = Column(Float, nullable=False)  # the post's own weight at creation; removing votes never goes below it
+
+    __table_args__ = (
+        Index("ix_trending_scores_score_post_id", "score", "post_id"),  # GET /posts/trending reads it backwards
+    )
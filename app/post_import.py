@@ -0,0 +1,134 @@
+"""Bulk post import from NDJSON or CSV.
+
+Rows are validated with PostCreate and written in chunks of IMPORT_CHUNK_SIZE,
+one transaction per chunk: COPY on Postgres, a single executemany INSERT
+elsewhere. Invalid rows and failed chunks are reported and skipped; the rest of
+the file is still imported.
+
+Run with: python -m app.post_import --account-id 1 posts.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas, shared_cache, trending
+from .config import settings
+
+FORMATS = ("ndjson", "csv")
+_COLUMNS = ("title", "text", "account_id")
+
+
+def guess_format(filename: str | None) -> str:
+    return "csv" if (filename or "").lower().endswith(".csv") else "ndjson"
+
+
+def read_records(binary_file, fmt: str):
+    """Yield (line number, dict or error message) for every record in ``binary_file``."""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        try:
+            for record in reader:
+                yield reader.line_num, record
+        except (csv.Error, UnicodeDecodeError) as e:
+            yield reader.line_num, f"unreadable CSV: {e}"
+        return
+
+    line_no = 0
+    try:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"invalid JSON: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "expected a JSON object"
+    except UnicodeDecodeError as e:
+        yield line_no + 1, f"unreadable line: {e}"
+
+
+async def _write_chunk(db: AsyncSession, rows: list[tuple]):
+    if db.get_bind().dialect.name == "postgresql":
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table("posts", records=rows, columns=_COLUMNS)
+    else:
+        await db.execute(insert(models.PostsTable), [dict(zip(_COLUMNS, row)) for row in rows])
+
+
+async def import_posts(db: AsyncSession, account_id: int, records, chunk_size: int | None = None) -> dict:
+    """Import ``records`` (see read_records) as posts of ``account_id``; returns a report."""
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    report = {"imported": 0, "rejected": 0, "chunks": 0, "errors": []}
+
+    def error(chunk: int, line: int | None, detail: str):
+        report["rejected"] += 1
+        if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+            report["errors"].append({"chunk": chunk, "line": line, "detail": detail})
+
+    records = iter(records)
+    while chunk := list(islice(records, chunk_size)):
+        report["chunks"] += 1
+        rows, lines = [], []
+        for line_no, record in chunk:
+            if isinstance(record, str):
+                error(report["chunks"], line_no, record)
+                continue
+            try:
+                post = schemas.PostCreate.model_validate(record)
+            except ValidationError as e:
+                error(report["chunks"], line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            rows.append((post.title, post.text, account_id))
+            lines.append(line_no)
+        if not rows:
+            continue
+
+        try:
+            await _write_chunk(db, rows)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            report["rejected"] += len(rows)
+            if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+                report["errors"].append({"chunk": report["chunks"], "line": lines[0], "detail": f"chunk not written: {e}"})
+            continue
+        report["imported"] += len(rows)
+
+    if report["imported"]:
+        await trending.add_missing_posts(db, account_id)
+        await db.commit()
+        await shared_cache.invalidate(f"posts:{account_id}")
+    return report
+
+
+async def _main(path: str, account_id: int, fmt: str):
+    from .database import async_engine, async_session_local
+
+    try:
+        with open(path, "rb") as f:
+            async with async_session_local() as db:
+                report = await import_posts(db, account_id, read_records(f, fmt))
+    finally:
+        await async_engine.dispose()
+    for entry in report["errors"]:
+        print(f"chunk {entry['chunk']}, line {entry['line']}: {entry['detail']}")
+    print(f"imported {report['imported']} post(s), rejected {report['rejected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import posts from NDJSON or CSV (title,text columns)")
+    parser.add_argument("path")
+    parser.add_argument("--account-id", type=int, required=True)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    args = parser.parse_args()
+    asyncio.run(_main(args.path, args.account_id, args.format or guess_format(args.path)))
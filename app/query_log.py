@@ -0,0 +1,100 @@
+"""Slow-query log.
+
+Statements slower than SLOW_QUERY_MS are logged with their normalized SQL, the
+route that ran them and redacted parameters. With SLOW_QUERY_EXPLAIN, slow
+SELECTs are re-run under EXPLAIN ANALYZE (EXPLAIN QUERY PLAN on SQLite) and the
+plan is logged too. Per-request totals are in the Server-Timing header when
+SQL_DEBUG_HEADER is on (see metrics.MetricsMiddleware).
+"""
+import logging
+import re
+import time
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+from .config import settings
+from .metrics import request_stats
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*\)")
+_SAFE_TYPES = (int, float, bool, type(None), date, datetime)
+
+
+def normalize(statement: str) -> str:
+    """One line, literals replaced by ?, and IN-lists of any length shown as (?, ...)."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PARAM_LIST.sub("(?, ...)", statement)
+    return _LITERAL.sub("?", statement)
+
+
+def redact(parameters):
+    # Ids, numbers and timestamps help reproduce a plan; strings may hold emails, hashes or post text
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    if isinstance(parameters, _SAFE_TYPES):
+        return parameters
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__}:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+def _current_route() -> str:
+    stats = request_stats.get()
+    if stats is None:
+        return "-"  # background work: vote buffer flushes, CLI scripts
+    return getattr(stats.scope.get("route"), "path", stats.scope.get("path", "-"))
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    # A raw DBAPI cursor: bypasses these events and leaves the ORM state alone
+    cursor = conn.connection.cursor()
+    try:
+        if conn.dialect.name == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+
+        # Inside a savepoint, so a failing EXPLAIN cannot abort the request's transaction
+        cursor.execute("SAVEPOINT query_log_explain")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT query_log_explain")
+            cursor.execute("RELEASE SAVEPOINT query_log_explain")
+        return plan
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_log_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - context._query_log_start) * 1000
+    if settings.SLOW_QUERY_MS <= 0 or elapsed_ms < settings.SLOW_QUERY_MS:
+        return
+
+    message = "slow query %.1fms route=%s sql=%s params=%s"
+    args = [elapsed_ms, _current_route(), normalize(statement), redact(parameters)]
+    # EXPLAIN ANALYZE runs the statement again, so only ever for plain reads
+    if settings.SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip().upper().startswith("SELECT"):
+        try:
+            args.append(_explain(conn, statement, parameters))
+            message += "\nplan:\n%s"
+        except Exception as e:
+            args.append(e)
+            message += " (explain failed: %s)"
+    logger.warning(message, *args)
+
+
+def instrument_engine(engine):
+    """Log slow statements run on ``engine`` (a sync Engine; pass async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,157 @@
+"""Per-route rate limits, per client IP or per user.
+
+Limits are token buckets kept as GCRA "theoretical arrival times": one float
+per key, so a check is a dict lookup and a little arithmetic. Each worker
+checks its own buckets first; with RATE_LIMIT_URL (redis:// or sqlite:///) an
+allowed request is then checked against the bucket shared by all workers.
+This worker's requests are a subset of everyone's, so an empty local bucket
+means the shared one is empty too. Floods are rejected without a round trip
+to the backend.
+
+Routes opt in with ``dependencies=[Depends(rate_limit.limit(...))]``.
+"""
+import logging
+import math
+import time
+
+from fastapi import Depends, HTTPException, Request, status
+
+from .backends import SQLiteBackend, backend_from_url
+from .config import settings
+from .metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# The same check in the shared backend, atomically. Returns 0 if allowed, else seconds until it would be.
+_THROTTLE_LUA = """
+local now, interval, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+local wait = tat - now - burst * interval
+if wait > 0 then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+return '0'
+"""
+
+
+def _throttle_sqlite(conn, key, interval, burst):
+    now = time.time()
+    row = conn.execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+    tat = max(float(row[0]) if row else now, now) + interval
+    wait = tat - now - burst * interval
+    if wait <= 0:
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, str(tat), tat))
+    return max(wait, 0.0)
+
+
+async def _throttle(backend, key: str, interval: float, burst: int) -> float:
+    if isinstance(backend, SQLiteBackend):
+        return await backend.transaction(_throttle_sqlite, key, interval, burst)
+    return float(await backend.eval(_THROTTLE_LUA, [key], time.time(), interval, burst))
+
+
+def parse_rate(rate: str) -> tuple[float, int] | None:
+    """"10/minute" -> (6.0, 10): one token every 6 seconds, up to 10 at once. Empty disables the limit."""
+    if not rate:
+        return None
+    count, _, period = rate.partition("/")
+    if period not in _PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f"invalid rate limit {rate!r}, expected e.g. '10/minute'")
+    return _PERIODS[period] / int(count), int(count)
+
+
+class RateLimiter:
+    _SWEEP_EVERY = 10000
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._tats = {}  # key -> theoretical arrival time; the bucket is full again once it has passed
+        self._checks = 0
+        self.allowed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    def _take_local(self, key: str, interval: float, burst: int, now: float) -> float:
+        tat = max(self._tats.get(key, now), now) + interval
+        wait = tat - now - burst * interval
+        if wait > 0:
+            return wait
+        self._tats[key] = tat
+        return 0.0
+
+    def _sweep(self, now: float):
+        self._tats = {key: tat for key, tat in self._tats.items() if tat > now}
+
+    async def take(self, key: str, interval: float, burst: int) -> float:
+        """Spend one token from ``key``; returns 0 when allowed, else seconds until a token is free."""
+        now = time.time()
+        self._checks += 1
+        if self._checks % self._SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        wait = self._take_local(key, interval, burst, now)
+        if wait == 0 and self.backend is not None:
+            try:
+                wait = await _throttle(self.backend, key, interval, burst)
+            except Exception:
+                # Fail open to this worker's own limit rather than rejecting everyone
+                self.backend_errors += 1
+                logger.exception("rate limit backend failed")
+            if wait > 0:
+                self._tats[key] -= interval  # refund: only accepted requests count against the local bucket
+
+        if wait > 0:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def clear(self):
+        self._tats.clear()
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._tats),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "backend_errors": self.backend_errors,
+            "shared": self.backend is not None,
+        }
+
+
+limiter = RateLimiter(backend_from_url(settings.RATE_LIMIT_URL) if settings.RATE_LIMIT_URL else None)
+
+
+async def _enforce(name: str, key: str, interval: float, burst: int):
+    wait = await limiter.take(f"rl:{name}:{key}", interval, burst)
+    if wait > 0:
+        RATE_LIMITED.labels(name).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def limit(name: str, rate: str, user_dependency=None):
+    """Dependency allowing ``rate`` requests per client IP, or per user when ``user_dependency``
+    (e.g. auth.get_current_user_id) is given. The rate is parsed once, here."""
+    parsed = parse_rate(rate)
+
+    if user_dependency is None:
+        async def dependency(request: Request):
+            # The peer address; uvicorn replaces it with X-Forwarded-For from proxies in --forwarded-allow-ips
+            # (FORWARDED_ALLOW_IPS, set in app/Dockerfile; gunicorn trusts 127.0.0.1 by default)
+            if parsed is not None:
+                await _enforce(name, f"ip:{request.client.host if request.client else '-'}", *parsed)
+    else:
+        async def dependency(current_user=Depends(user_dependency)):
+            if parsed is not None:
+                await _enforce(name, f"user:{current_user.id}", *parsed)
+
+    return dependency
@@ -0,0 +1,32 @@
+"""Repair drift between posts.vote_count and the votes table.
+
+Run with: python -m app.reconcile
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import session_local
+
+
+def reconcile_vote_counts(db: Session) -> int:
+    actual = (
+        select(func.count(models.Vote.post_id))
+        .where(models.Vote.post_id == models.PostsTable.id)
+        .scalar_subquery()
+    )
+    fixed = (
+        db.query(models.PostsTable)
+        .filter(models.PostsTable.vote_count != actual)
+        .update({models.PostsTable.vote_count: actual}, synchronize_session=False)
+    )
+    db.commit()
+    return fixed
+
+
+if __name__ == "__main__":
+    db = session_local()
+    try:
+        print(f"vote_count repaired on {reconcile_vote_counts(db)} post(s)")
+    finally:
+        db.close()
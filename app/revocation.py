@@ -0,0 +1,230 @@
+"""Revoked token ids (jti), checked in-process on every authenticated request.
+
+Each worker keeps the unexpired revoked jtis in a dict fronted by a Bloom
+filter: the common case, a token that was never revoked, is answered by a few
+bit tests, and the dict confirms the rare positives. Entries are dropped once
+the token they revoke has expired.
+
+With REVOCATION_SYNC_URL (redis:// or a sqlite:/// file shared on one host) a
+revocation is also appended to a log in that backend, which every worker polls
+every REVOCATION_SYNC_SECONDS. Without it, revocations only reach the worker
+that made them.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from .backends import SQLiteBackend, backend_from_url
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Taking a sequence number and writing its entry happen together, so a reader never
+# sees a number whose entry is still to come and skips past it
+_PUBLISH_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('SET', ARGV[1] .. seq, ARGV[2], 'PX', ARGV[3])
+return seq
+"""
+
+
+def _publish_sqlite(conn, value, expires_at):
+    seq = conn.execute(
+        "INSERT INTO cache (key, value, expires_at) VALUES ('revoked:seq', 1, NULL)"
+        " ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value"
+    ).fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (f"revoked:{seq}", value, expires_at))
+    return seq
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._entries = {}  # jti -> exp (unix time)
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self.bloom_rejections = 0
+        self.false_positives = 0
+
+    def add(self, jti: str, exp: float):
+        if exp <= time.time():
+            return
+        with self._lock:
+            self._entries[jti] = exp
+            self._bloom.add(jti)
+            grow = len(self._entries) > self.capacity
+        if grow:
+            self.purge()
+
+    def __contains__(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            self.bloom_rejections += 1
+            return False
+        exp = self._entries.get(jti)
+        if exp is None:
+            self.false_positives += 1
+            return False
+        return exp > time.time()
+
+    def purge(self):
+        """Forget expired entries; the Bloom filter is rebuilt since it cannot delete."""
+        now = time.time()
+        with self._lock:
+            self._entries = {jti: exp for jti, exp in self._entries.items() if exp > now}
+            self.capacity = max(self.capacity, 2 * len(self._entries))
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            for jti in self._entries:
+                self._bloom.add(jti)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "bloom_bits": self._bloom.size,
+            "bloom_hashes": self._bloom.hashes,
+            "bloom_rejections": self.bloom_rejections,
+            "false_positives": self.false_positives,
+        }
+
+
+class RevocationSync:
+    """Append-only log of revocations in a shared backend: a sequence counter plus one key per entry.
+
+    Entries expire with their token. ``revoked:low`` marks the oldest entry
+    that may still be live, so a worker starting up reads from there instead
+    of replaying the whole log; workers move it up every few pulls.
+    """
+
+    _BATCH = 500
+    _ADVANCE_EVERY = 60  # pulls between attempts to move the low-water mark
+
+    def __init__(self, backend, revoked: RevocationList, interval: float):
+        self.backend = backend
+        self.revoked = revoked
+        self.interval = interval
+        self.seen = 0
+        self.pulls = 0
+        self.errors = 0
+        self._timer = None
+
+    async def publish(self, jti: str, exp: float):
+        ttl = exp - time.time()
+        if ttl <= 0:
+            return
+        value = f"{jti} {exp}".encode()
+        if isinstance(self.backend, SQLiteBackend):
+            await self.backend.transaction(_publish_sqlite, value, exp)
+        else:
+            await self.backend.eval(_PUBLISH_LUA, ["revoked:seq"], "revoked:", value, math.ceil(ttl * 1000))
+
+    async def pull(self):
+        latest, low = await self.backend.get_many(["revoked:seq", "revoked:low"])
+        latest = int(latest) if latest else 0
+        low = int(low) if low else 1
+        # Everything below the low-water mark has expired
+        self.seen = max(self.seen, low - 1)
+        while self.seen < latest:
+            upto = min(latest, self.seen + self._BATCH)
+            # Keys of entries whose token has expired are gone already; nothing to apply for them
+            for value in await self.backend.get_many([f"revoked:{seq}" for seq in range(self.seen + 1, upto + 1)]):
+                if value:
+                    jti, exp = value.decode().split()
+                    self.revoked.add(jti, float(exp))
+            self.seen = upto
+        if self.pulls % self._ADVANCE_EVERY == 0:
+            await self._advance_low(low, latest)
+        self.pulls += 1
+
+    async def _advance_low(self, low: int, latest: int):
+        # Up to the first entry still there; a missing one below ``latest`` has expired, since it is
+        # written together with its sequence number. Racing workers can only set it lower than due.
+        start = low
+        while low <= latest:
+            upto = min(latest, low + self._BATCH - 1)
+            values = await self.backend.get_many([f"revoked:{seq}" for seq in range(low, upto + 1)])
+            live = next((seq for seq, value in zip(range(low, upto + 1), values) if value), None)
+            if live is not None:
+                low = live
+                break
+            low = upto + 1
+        if low > start:
+            await self.backend.set("revoked:low", str(low).encode(), None)
+
+    async def _run_timer(self):
+        while True:
+            try:
+                await self.pull()
+                self.revoked.purge()
+            except Exception:
+                self.errors += 1
+                logger.exception("revocation sync failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        return {"seen": self.seen, "pulls": self.pulls, "errors": self.errors}
+
+
+revoked = RevocationList(capacity=settings.REVOCATION_CAPACITY)
+sync = (
+    RevocationSync(backend_from_url(settings.REVOCATION_SYNC_URL), revoked, settings.REVOCATION_SYNC_SECONDS)
+    if settings.REVOCATION_SYNC_URL
+    else None
+)
+
+
+async def revoke(jti: str | None, exp: float):
+    if not jti:
+        return  # issued before tokens carried a jti
+    revoked.add(jti, exp)
+    if sync is not None:
+        try:
+            await sync.publish(jti, exp)
+        except Exception:
+            # Still revoked on this worker; the others keep accepting it until it expires
+            sync.errors += 1
+            logger.exception("publishing revocation failed")
+
+
+def is_revoked(jti: str | None) -> bool:
+    return bool(jti) and jti in revoked
@@ -0,0 +1,40 @@
+import os
+
+from fastapi import APIRouter
+
+from app import auth, database, rate_limit, revocation, shared_cache
+from app.routers import votes
+
+# Operational endpoints; nginx does not route /internal from outside (see nginx.conf)
+router = APIRouter(prefix="/internal", tags=["Internal"], include_in_schema=False)
+
+
+@router.get("/cache")
+async def cache_stats():
+    return {
+        "pid": os.getpid(),
+        "user_cache": auth.user_cache.stats(),
+        "token_cache": auth.token_cache.stats(),
+        "shared_cache": shared_cache.cache.stats() if shared_cache.cache is not None else None,
+        "revocation": {**revocation.revoked.stats(), "sync": revocation.sync.stats() if revocation.sync is not None else None},
+    }
+
+
+@router.get("/pool")
+async def pool_stats():
+    return {
+        "pid": os.getpid(),
+        "async": database.pool_stats(database.async_engine),
+        "sync": database.pool_stats(database.engine),
+        "read_replicas": database.replicas.stats(),
+    }
+
+
+@router.get("/vote-buffer")
+async def vote_buffer_stats():
+    return {"pid": os.getpid(), **votes.vote_buffer.stats()}
+
+
+@router.get("/rate-limit")
+async def rate_limit_stats():
+    return {"pid": os.getpid(), **rate_limit.limiter.stats()}
@@ -1,59 +1,284 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, select, tuple_, update
+from datetime import datetime
+from typing import List, Literal, Optional
+import base64
+import json
 
-from app import models, schemas, database, auth
+from app import models, schemas, database, auth, http_cache, post_import, rate_limit, shared_cache, trending
+from app import search as search_engine
+from app.config import settings
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
-@router.get("", response_model=List[schemas.PostVoteResponse])
-def get_posts( db: Session = Depends(database.get_db),  current_user: models.UsersTable = Depends(auth.get_current_user_id), limit: int = 10,  skip: int = 0,  search: Optional[str] = ""):
-    results = (
-        db.query(models.PostsTable, func.count(models.Vote.post_id).label("votes"))
-        .join(models.Vote, models.PostsTable.id == models.Vote.post_id, isouter=True)
-        .group_by(models.PostsTable.id)
-        .filter(models.PostsTable.account_id == current_user.id)
-        .filter(models.PostsTable.title.contains(search))
-        .limit(limit)
-        .offset(skip)
-        .all()
+_read_limit = rate_limit.limit("posts:read", settings.RATE_LIMIT_POST_READS, auth.get_current_user_id)
+_write_limit = rate_limit.limit("posts:write", settings.RATE_LIMIT_POST_WRITES, auth.get_current_user_id)
+
+def _encode_cursor(post: models.PostsTable) -> str:
+    raw = json.dumps([post.created_at.isoformat(), post.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, post_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _encode_trending_cursor(score: float, post_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, post_id]).encode()).decode().rstrip("=")
+
+
+def _decode_trending_cursor(cursor: str):
+    try:
+        score, post_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), int(post_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# Author columns PostResponse.account needs, fetched in the same statement as the posts
+_with_account = joinedload(models.PostsTable.account, innerjoin=True).load_only(
+    models.UsersTable.id, models.UsersTable.email, models.UsersTable.created_at
+)
+
+# Columns for the fast list path, in the field order of schemas.PostVoteResponse
+_POST_ROW_COLUMNS = (
+    models.PostsTable.title,
+    models.PostsTable.text,
+    models.PostsTable.id,
+    models.PostsTable.created_at,
+    models.PostsTable.account_id,
+    models.UsersTable.email.label("account_email"),
+    models.UsersTable.created_at.label("account_created_at"),
+    models.PostsTable.vote_count,
+)
+
+
+async def _voted_post_ids(db: AsyncSession, user_id: int, post_ids) -> set:
+    """The posts among ``post_ids`` the user has voted on: one lookup on the votes PK per page."""
+    if not post_ids:
+        return set()
+    return set(await db.scalars(
+        select(models.Vote.post_id).filter(models.Vote.user_id == user_id, models.Vote.post_id.in_(post_ids))
+    ))
+
+
+def _post_vote_items(posts, voted: set) -> list:
+    return [{"post": post, "vote": post.vote_count, "voted": post.id in voted} for post in posts]
+
+
+def _post_vote_json(rows, voted: set) -> bytes:
+    # Must stay byte-identical to what response_model=List[PostVoteResponse] produces (see tests)
+    return orjson.dumps(
+        [
+            {
+                "post": {
+                    "title": row.title,
+                    "text": row.text,
+                    "id": row.id,
+                    "created_at": row.created_at,
+                    "account_id": row.account_id,
+                    "account": {"id": row.account_id, "email": row.account_email, "created_at": row.account_created_at},
+                },
+                "vote": row.vote_count,
+                "voted": row.id in voted,
+            }
+            for row in rows
+        ],
+        option=orjson.OPT_UTC_Z,
     )
-    return [{"post": post, "vote": vote} for post, vote in results]
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PostCreate)
-def create_post( post: schemas.PostCreate, db: Session = Depends(database.get_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+
+_post_vote_list = TypeAdapter(List[schemas.PostVoteResponse])
+
+
+async def _cached_json(key: str, tags, render, if_none_match: Optional[str] = None) -> Response:
+    """Serve ``render() -> (json bytes, headers)`` through the shared cache, answering If-None-Match from it."""
+    async def compute():
+        body, headers = await render()
+        return orjson.dumps({"headers": headers, "body": body.decode()})
+
+    entry = orjson.loads(await shared_cache.cache.get_or_set(key, tags, compute))
+    etag = entry["headers"].get("ETag")
+    if etag and http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag, entry["headers"]["Cache-Control"])
+    return Response(entry["body"], media_type="application/json", headers=entry["headers"])
+
+
+async def _select_posts(db: AsyncSession, account_id: int, limit: int, skip: int, search: Optional[str], cursor: Optional[str]):
+    """Returns (rows, fast, next cursor); rows are plain rows when fast, PostsTable objects otherwise."""
+    fast = settings.FAST_POST_LISTS
+    if fast:
+        query = select(*_POST_ROW_COLUMNS).join(models.PostsTable.account)
+    else:
+        query = select(models.PostsTable).options(_with_account)
+    query = query.filter(models.PostsTable.account_id == account_id)
+    ranked = search_engine.is_search(search)
+    if ranked:
+        # Relevance order has no stable keyset, so search results page with skip only
+        query = search_engine.apply(query, db.get_bind().dialect.name, search).offset(skip)
+    else:
+        query = query.order_by(models.PostsTable.created_at, models.PostsTable.id)
+        if cursor:
+            # Keyset page: seek past the last row of the previous page instead of OFFSET
+            query = query.filter(tuple_(models.PostsTable.created_at, models.PostsTable.id) > _decode_cursor(cursor))
+        else:
+            query = query.offset(skip)
+    query = query.limit(limit)
+    posts = (await db.execute(query)).all() if fast else (await db.scalars(query)).all()
+
+    next_cursor = _encode_cursor(posts[-1]) if not ranked and posts and len(posts) == limit else None
+    return posts, fast, next_cursor
+
+
+@router.get("", response_model=List[schemas.PostVoteResponse], dependencies=[Depends(_read_limit)])
+async def get_posts( response: Response, db: AsyncSession = Depends(database.get_read_db), primary: AsyncSession = Depends(database.get_async_db),  current_user: models.UsersTable = Depends(auth.get_current_user_id), limit: int = 10,  skip: int = 0,  search: Optional[str] = "", cursor: Optional[str] = None):
+    if shared_cache.cache is not None:
+        # Fill from the primary: a lagging replica's rows would be stored under the tag versions
+        # the latest write just bumped, and served to every worker until the TTL
+        async def render():
+            posts, fast, next_cursor = await _select_posts(primary, current_user.id, limit, skip, search, cursor)
+            voted = await _voted_post_ids(primary, current_user.id, [post.id for post in posts])
+            if fast:
+                body = _post_vote_json(posts, voted)
+            else:
+                body = _post_vote_list.dump_json(_post_vote_list.validate_python(_post_vote_items(posts, voted), from_attributes=True))
+            return body, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+        key = "posts:" + orjson.dumps([current_user.id, limit, skip, search, cursor, settings.FAST_POST_LISTS]).decode()
+        return await _cached_json(key, [f"posts:{current_user.id}"], render)
+
+    posts, fast, next_cursor = await _select_posts(db, current_user.id, limit, skip, search, cursor)
+    voted = await _voted_post_ids(db, current_user.id, [post.id for post in posts])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if fast:
+        return Response(_post_vote_json(posts, voted), media_type="application/json", headers=response.headers)
+    return _post_vote_items(posts, voted)
+
+@router.get("/trending", response_model=List[schemas.PostVoteResponse], dependencies=[Depends(_read_limit)])
+async def get_trending_posts( response: Response, db: AsyncSession = Depends(database.get_read_db), current_user: models.UsersTable = Depends(auth.get_current_user_id), limit: int = 10, cursor: Optional[str] = None):
+    # Walks ix_trending_scores_score_post_id backwards: cost is the page size, not the number of posts
+    score = models.TrendingScore
+    if settings.FAST_POST_LISTS:
+        query = select(*_POST_ROW_COLUMNS, score.score).join(models.PostsTable.account)
+    else:
+        query = select(models.PostsTable, score.score).options(_with_account)
+    query = query.join(score, score.post_id == models.PostsTable.id).order_by(score.score.desc(), score.post_id.desc())
+    if cursor:
+        query = query.filter(tuple_(score.score, score.post_id) < _decode_trending_cursor(cursor))
+    rows = (await db.execute(query.limit(limit))).all()
+    post_ids = [row.id if settings.FAST_POST_LISTS else row.PostsTable.id for row in rows]
+    voted = await _voted_post_ids(db, current_user.id, post_ids)
+
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_trending_cursor(rows[-1].score, post_ids[-1])
+    if settings.FAST_POST_LISTS:
+        return Response(_post_vote_json(rows, voted), media_type="application/json", headers=response.headers)
+    return _post_vote_items([post for post, _ in rows], voted)
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PostCreate, dependencies=[Depends(_write_limit)])
+async def create_post( post: schemas.PostCreate, db: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
     new_post = models.PostsTable(
         title=post.title,
         text=post.text,
         account_id=current_user.id  # Use .id not the object
     )
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await db.flush()
+    await trending.add_posts(db, [new_post.id])
+    await db.commit()
+    await db.refresh(new_post)
+    await shared_cache.invalidate(f"posts:{current_user.id}")
     return new_post
 
-@router.get("/{id}", response_model=schemas.PostVoteResponse)
-def get_post( id: int, db: Session = Depends(database.get_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
-    result = (
-        db.query(models.PostsTable, func.count(models.Vote.post_id).label("votes"))
-        .join(models.Vote, models.PostsTable.id == models.Vote.post_id, isouter=True)
-        .group_by(models.PostsTable.id)
-        .filter(models.PostsTable.id == id)
+@router.post("/import", response_model=schemas.PostImportReport, dependencies=[Depends(_write_limit)])
+async def import_posts( file: UploadFile, format: Optional[Literal["ndjson", "csv"]] = None, db: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+    records = post_import.read_records(file.file, format or post_import.guess_format(file.filename))
+    return await post_import.import_posts(db, current_user.id, records)
+
+@router.get("/export")
+async def export_posts( db: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+    # Server-side cursor, EXPORT_BATCH_SIZE rows at a time: memory stays flat however many posts there are,
+    # and each batch waits for the previous one to be sent, so a slow client slows the cursor down
+    query = (
+        select(models.PostsTable.id, models.PostsTable.title, models.PostsTable.text, models.PostsTable.created_at, models.PostsTable.vote_count)
         .filter(models.PostsTable.account_id == current_user.id)
-        .first()
+        .order_by(models.PostsTable.created_at, models.PostsTable.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
     )
+
+    async def lines():
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield b"".join(orjson.dumps(row._asdict(), option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="posts.ndjson"'},
+    )
+
+def _post_etag(post_id: int, version: int, vote_count: int, voted: bool) -> str:
+    return http_cache.make_etag("post", post_id, version, vote_count, int(voted))
+
+def _voted_by(user_id: int, post_id: int):
+    # A single post needs no batch lookup; one PK probe inside the post's own SELECT
+    return select(models.Vote.post_id).filter(models.Vote.user_id == user_id, models.Vote.post_id == post_id).exists()
+
+async def _load_post(db: AsyncSession, post_id: int, account_id: int) -> tuple[models.PostsTable, bool]:
+    """The post with its author, and whether ``account_id`` has voted on it."""
+    row = (await db.execute(
+        select(models.PostsTable, _voted_by(account_id, post_id))
+        .options(_with_account)
+        .filter(models.PostsTable.id == post_id)
+        .filter(models.PostsTable.account_id == account_id)
+    )).first()
     
-    if not result:
+    if not row:
         raise HTTPException(status_code=404, detail="Post not found")
-    
-    post, vote = result
-    return {"post": post, "vote": vote}
+    return tuple(row)
+
+@router.get("/{id}", response_model=schemas.PostVoteResponse, dependencies=[Depends(_read_limit)])
+async def get_post( id: int, request: Request, response: Response, db: AsyncSession = Depends(database.get_read_db), primary: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+    if_none_match = request.headers.get("if-none-match")
+    if shared_cache.cache is not None:
+        async def render():
+            # From the primary, like get_posts' fills
+            post, voted = await _load_post(primary, id, current_user.id)
+            body = schemas.PostVoteResponse.model_validate({"post": post, "vote": post.vote_count, "voted": voted}, from_attributes=True).model_dump_json()
+            etag = _post_etag(post.id, post.version, post.vote_count, voted)
+            return body.encode(), {"ETag": etag, "Cache-Control": http_cache.POST_CACHE_CONTROL}
+
+        return await _cached_json(f"post:{id}:{current_user.id}", [f"post:{id}"], render, if_none_match)
+
+    if if_none_match:
+        # Revalidation: compare against version, vote count and the caller's vote before loading the full row
+        current = (await db.execute(
+            select(models.PostsTable.version, models.PostsTable.vote_count, _voted_by(current_user.id, id))
+            .filter(models.PostsTable.id == id)
+            .filter(models.PostsTable.account_id == current_user.id)
+        )).first()
+        if current and http_cache.etag_matches(if_none_match, _post_etag(id, *current)):
+            return http_cache.not_modified(_post_etag(id, *current), http_cache.POST_CACHE_CONTROL)
+
+    post, voted = await _load_post(db, id, current_user.id)
+    response.headers["ETag"] = _post_etag(post.id, post.version, post.vote_count, voted)
+    response.headers["Cache-Control"] = http_cache.POST_CACHE_CONTROL
+    return {"post": post, "vote": post.vote_count, "voted": voted}
 
 @router.delete("/{id}", status_code=status.HTTP_200_OK)
-def delete_post( id: int, db: Session = Depends(database.get_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
-    post_query = db.query(models.PostsTable).filter(models.PostsTable.id == id)
-    post = post_query.first()
+async def delete_post( id: int, request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+    post = await db.get(models.PostsTable, id)
     
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -61,15 +286,16 @@ def delete_post( id: int, db: Session = Depends(database.get_db), current_user:
     if post.account_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    post_query.delete(synchronize_session=False)
-    db.commit()
+    await db.execute(delete(models.PostsTable).filter(models.PostsTable.id == id))
+    await db.commit()
+    await shared_cache.invalidate(*shared_cache.post_tags(id, current_user.id))
+    background_tasks.add_task(http_cache.purge, request.headers, f"/posts/{id}")
     
     return {"message": "Post deleted successfully"}
 
 @router.put("/{id}", response_model=schemas.PostUpdate)
-def update_post( id: int, updated_post: schemas.PostUpdate, db: Session = Depends(database.get_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
-    post_query = db.query(models.PostsTable).filter(models.PostsTable.id == id)
-    post = post_query.first()
+async def update_post( id: int, updated_post: schemas.PostUpdate, request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(database.get_async_db), current_user: models.UsersTable = Depends(auth.get_current_user_id)):
+    post = await db.get(models.PostsTable, id)
     
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -77,7 +303,14 @@ def update_post( id: int, updated_post: schemas.PostUpdate, db: Session = Depend
     if post.account_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    post_query.update(updated_post.dict(), synchronize_session=False)
-    db.commit()
+    await db.execute(
+        update(models.PostsTable)
+        .filter(models.PostsTable.id == id)
+        .values(**updated_post.model_dump(), version=models.PostsTable.version + 1)
+    )
+    await db.commit()
+    await db.refresh(post)
+    await shared_cache.invalidate(*shared_cache.post_tags(id, current_user.id))
+    background_tasks.add_task(http_cache.purge, request.headers, f"/posts/{id}")
     
-    return post_query.first()
\ No newline at end of file
+    return post
@@ -1,26 +1,35 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from app import hash_verify, schemas, models, database
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Request, Response, status, Depends
+from sqlalchemy import select
+from app import hash_verify, http_cache, schemas, models, database
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.get("/{id}", response_model=schemas.UserResponse)
-def get_user(id : int, db : Session = Depends(database.get_db)):
-    user = db.query(models.UsersTable).filter(models.UsersTable.id == id).first()
+async def get_user(id : int, request : Request, response : Response, db : AsyncSession = Depends(database.get_read_db)):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await db.scalar(select(models.UsersTable.version).filter(models.UsersTable.id == id))
+        if version is not None and http_cache.etag_matches(if_none_match, http_cache.make_etag("user", id, version)):
+            return http_cache.not_modified(http_cache.make_etag("user", id, version), http_cache.USER_CACHE_CONTROL)
+
+    user = await db.get(models.UsersTable, id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    response.headers["ETag"] = http_cache.make_etag("user", user.id, user.version)
+    response.headers["Cache-Control"] = http_cache.USER_CACHE_CONTROL
     return user
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.UserResponse)
-def create_user(user : schemas.UserCreate, db : Session = Depends(database.get_db)):
+async def create_user(user : schemas.UserCreate, db : AsyncSession = Depends(database.get_async_db)):
 
-    hashed_password = hash_verify.hash(user.password)
+    hashed_password = await hash_verify.hash_async(user.password)
 
     user.password = hashed_password
-    new_user = models.UsersTable(**user.dict())
+    new_user = models.UsersTable(**user.model_dump())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
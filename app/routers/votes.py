@@ -1,45 +1,192 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from .. import schemas, auth, database, models
+from collections import Counter
+from typing import List
+
+from fastapi import APIRouter, BackgroundTasks, Body, HTTPException, Request, Response, status, Depends
+from sqlalchemy import case, delete, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, auth, database, http_cache, models, rate_limit, shared_cache, trending
+from ..config import settings
+from ..vote_buffer import VoteBuffer
 
 router = APIRouter(prefix="/votes", tags=["Votes"])
 
+_vote_limit = rate_limit.limit("votes", settings.RATE_LIMIT_VOTES, auth.get_current_user_id)
+
+
+async def bump_vote_count(db: AsyncSession, post_id: int, added_at=(), removed_at=()):
+    # Relative UPDATE so concurrent votes on the same post never lose an increment.
+    # added_at / removed_at: created_at of the votes just added / removed
+    delta = len(added_at) - len(removed_at)
+    if delta:
+        await db.execute(
+            update(models.PostsTable)
+            .filter(models.PostsTable.id == post_id)
+            .values(vote_count=models.PostsTable.vote_count + delta)
+        )
+        await trending.record_votes(db, [(post_id, at) for at in added_at], [(post_id, at) for at in removed_at])
+
+
+async def apply_votes(db: AsyncSession, votes: dict) -> dict:
+    """Apply {(user_id, post_id): vote_option} with set-based statements; does not commit.
+
+    Returns {(user_id, post_id): status}, status being one of VoteBatchResult.status.
+    """
+    if not votes:
+        return {}
+
+    post_ids = {post_id for _, post_id in votes}
+    existing = set(await db.scalars(select(models.PostsTable.id).filter(models.PostsTable.id.in_(post_ids))))
+    to_add = [key for key, option in votes.items() if option == 1 and key[1] in existing]
+    to_remove = [key for key, option in votes.items() if option != 1 and key[1] in existing]
+
+    added, deleted, inserted, removed = set(), set(), [], []
+    if to_add:
+        dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        result = await db.execute(
+            dialect_insert(models.Vote)
+            .values([{"user_id": user_id, "post_id": post_id} for user_id, post_id in to_add])
+            .on_conflict_do_nothing()
+            .returning(models.Vote.user_id, models.Vote.post_id, models.Vote.created_at)
+        )
+        inserted = result.all()
+        added = {(user_id, post_id) for user_id, post_id, _ in inserted}
+    if to_remove:
+        result = await db.execute(
+            delete(models.Vote)
+            .filter(tuple_(models.Vote.user_id, models.Vote.post_id).in_(to_remove))
+            .returning(models.Vote.user_id, models.Vote.post_id, models.Vote.created_at)
+        )
+        removed = [(user_id, post_id, created_at) for user_id, post_id, created_at in result]
+        deleted = {(user_id, post_id) for user_id, post_id, _ in removed}
+
+    deltas = Counter(post_id for _, post_id in added)
+    deltas.subtract(post_id for _, post_id in deleted)
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if deltas:
+        await db.execute(
+            update(models.PostsTable)
+            .filter(models.PostsTable.id.in_(deltas))
+            .values(vote_count=models.PostsTable.vote_count + case(deltas, value=models.PostsTable.id, else_=0))
+        )
+    if added or deleted:
+        await trending.record_votes(
+            db,
+            [(post_id, created_at) for _, post_id, created_at in inserted],
+            [(post_id, created_at) for _, post_id, created_at in removed],
+        )
+
+    statuses = {}
+    for key, option in votes.items():
+        if key[1] not in existing:
+            statuses[key] = "not_found"
+        elif option == 1:
+            statuses[key] = "added" if key in added else "conflict"
+        else:
+            statuses[key] = "deleted" if key in deleted else "not_found"
+    return statuses
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def create_vote(
+
+async def invalidate_voted_posts(db: AsyncSession, post_ids):
+    # Vote counts show up in the cached post and in its owner's post lists
+    if shared_cache.cache is None or not post_ids:
+        return
+    owners = await db.execute(
+        select(models.PostsTable.id, models.PostsTable.account_id).filter(models.PostsTable.id.in_(set(post_ids)))
+    )
+    await shared_cache.invalidate(*(tag for post_id, account_id in owners for tag in shared_cache.post_tags(post_id, account_id)))
+
+
+vote_buffer = VoteBuffer(
+    database.async_session_local,
+    apply_votes,
+    after_flush=lambda db, batch: invalidate_voted_posts(db, [post_id for _, post_id in batch]),
+    max_size=settings.VOTE_BUFFER_MAX_SIZE,
+    flush_interval=settings.VOTE_BUFFER_FLUSH_SECONDS,
+    max_pending=settings.VOTE_BUFFER_MAX_PENDING,
+    max_retries=settings.VOTE_BUFFER_MAX_RETRIES,
+)
+
+
+def _refresh_proxy_cache(background_tasks: BackgroundTasks, request: Request, post: models.PostsTable, user_id: int):
+    # Only the owner can read the post, and only their own cached copy can be refreshed from here
+    if post.account_id == user_id:
+        background_tasks.add_task(http_cache.purge, request.headers, f"/posts/{post.id}")
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(_vote_limit)])
+async def create_vote(
     vote: schemas.VoteBase,
-    db: Session = Depends(database.get_db),
+    response: Response,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(database.get_async_db),
     current_user: models.UsersTable = Depends(auth.get_current_user_id)
 ):
     # Check if post exists
-    post = db.query(models.PostsTable).filter(
-        models.PostsTable.id == vote.post_id
-    ).first()
+    post = await db.get(models.PostsTable, vote.post_id)
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    # Duplicate adds / missing removes are resolved at flush time, so they cannot be reported here.
+    # A full buffer (flushes failing or falling behind) makes this request write synchronously.
+    # No nginx refresh here: it would run before the flush and re-cache the old count.
+    if settings.VOTE_WRITE_BEHIND and vote_buffer.add(current_user.id, vote.post_id, vote.vote_option):
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"msg": "vote queued"}
     
     # Check if vote already exists - use current_user.id
-    vote_query = db.query(models.Vote).filter(
+    vote_filter = (
         models.Vote.post_id == vote.post_id,
         models.Vote.user_id == current_user.id  # Changed from current_user_id
     )
-    found_vote = vote_query.first()
+    found_vote = await db.scalar(select(models.Vote).filter(*vote_filter))
     
     if vote.vote_option == 1:
         # Add vote
         if found_vote:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT)
-        new_vote = models.Vote(
-            post_id=vote.post_id,
-            user_id=current_user.id  # Changed from current_user_id
+        # RETURNING the stored time: trending weighs the vote by it, now and when it is removed
+        created_at = await db.scalar(
+            insert(models.Vote)
+            .values(post_id=vote.post_id, user_id=current_user.id)
+            .returning(models.Vote.created_at)
         )
-        db.add(new_vote)
-        db.commit()
+        await bump_vote_count(db, vote.post_id, added_at=[created_at])
+        await db.commit()
+        await shared_cache.invalidate(*shared_cache.post_tags(post.id, post.account_id))
+        _refresh_proxy_cache(background_tasks, request, post, current_user.id)
         return {"msg": "added vote"}
     else:
         # Remove vote
         if not found_vote:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-        vote_query.delete(synchronize_session=False)
-        db.commit()
-        return {"msg": "deleted vote"}
\ No newline at end of file
+        removed_at = (await db.scalars(delete(models.Vote).filter(*vote_filter).returning(models.Vote.created_at))).all()
+        await bump_vote_count(db, vote.post_id, removed_at=removed_at)
+        await db.commit()
+        await shared_cache.invalidate(*shared_cache.post_tags(post.id, post.account_id))
+        _refresh_proxy_cache(background_tasks, request, post, current_user.id)
+        return {"msg": "deleted vote"}
+
+
+@router.post("/batch", response_model=List[schemas.VoteBatchResult], dependencies=[Depends(_vote_limit)])
+async def create_votes_batch(
+    votes: List[schemas.VoteBase] = Body(max_length=settings.VOTE_BATCH_MAX_SIZE),
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.UsersTable = Depends(auth.get_current_user_id)
+):
+    # Items for the same post collapse to the last one; earlier ones are reported as superseded
+    last_index = {vote.post_id: index for index, vote in enumerate(votes)}
+    statuses = await apply_votes(db, {(current_user.id, vote.post_id): vote.vote_option for vote in votes})
+    await db.commit()
+    await invalidate_voted_posts(db, [post_id for (_, post_id), status in statuses.items() if status in ("added", "deleted")])
+
+    return [
+        {
+            "post_id": vote.post_id,
+            "vote_option": vote.vote_option,
+            "status": statuses[(current_user.id, vote.post_id)] if last_index[vote.post_id] == index else "superseded",
+        }
+        for index, vote in enumerate(votes)
+    ]
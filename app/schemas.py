@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 from pydantic.types import conint
 
 
@@ -67,6 +67,7 @@ class PostResponse(PostBase):
 class PostVoteResponse(BaseModel):
     post: PostResponse
     vote: int
+    voted: bool = False  # whether the caller has voted on the post
 
     class Config:
         from_attributes = True
@@ -74,4 +75,21 @@ class PostVoteResponse(BaseModel):
 
 class VoteBase(BaseModel):
     post_id: int
-    vote_option: conint(le=1)  # constrained int
\ No newline at end of file
+    vote_option: conint(le=1)  # constrained int
+
+
+class VoteBatchResult(VoteBase):
+    status: Literal["added", "deleted", "conflict", "not_found", "superseded"]
+
+
+class PostImportError(BaseModel):
+    chunk: int
+    line: Optional[int]
+    detail: str
+
+
+class PostImportReport(BaseModel):
+    imported: int
+    rejected: int
+    chunks: int
+    errors: list[PostImportError]  # capped at IMPORT_MAX_ERRORS; rejected counts them all
@@ -0,0 +1,89 @@
+"""Full-text search over posts.title and posts.text.
+
+Postgres matches against the generated ``posts.search_vector`` column (GIN
+indexed, created by migration). SQLite uses an external-content FTS5 table kept
+in sync by triggers, so the test database goes through the same code path.
+"""
+import re
+
+from sqlalchemy import DDL, column, event, false, func, literal_column, or_, table
+
+from . import models
+
+TS_CONFIG = "simple"
+
+_WORD = re.compile(r"\w+")
+
+_posts = models.PostsTable.__table__
+_posts_fts = table("posts_fts", column("rowid"))
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE posts_fts USING fts5(title, text, content='posts', content_rowid='id')",
+    """CREATE TRIGGER posts_fts_ai AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+    """CREATE TRIGGER posts_fts_ad AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+    END""",
+    """CREATE TRIGGER posts_fts_au AFTER UPDATE OF title, text ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO posts_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    f"""ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS
+        (to_tsvector('{TS_CONFIG}', coalesce(title, '') || ' ' || coalesce(text, ''))) STORED""",
+    "CREATE INDEX ix_posts_search_vector ON posts USING gin (search_vector)",
+]
+
+# Alembic owns the Postgres schema; these hooks cover metadata.create_all() (tests, scratch databases).
+for statement in _SQLITE_DDL:
+    event.listen(_posts, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in _POSTGRES_DDL:
+    event.listen(_posts, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(_posts, "before_drop", DDL("DROP TABLE IF EXISTS posts_fts").execute_if(dialect="sqlite"))
+
+
+def terms(search: str | None) -> list[str]:
+    return _WORD.findall((search or "").lower())
+
+
+def is_search(search: str | None) -> bool:
+    """Whether ``search`` filters at all: blank means every post, anything else only what matches."""
+    return bool(search and search.strip())
+
+
+def apply(query, dialect_name: str, search: str | None):
+    """Filter ``query`` to posts matching every word of ``search`` (prefix match), best match first.
+
+    A search with no words in it (say "!!") matches nothing.
+    """
+    if not is_search(search):
+        return query
+    words = terms(search)
+    if not words:
+        return query.filter(false())
+
+    if dialect_name == "postgresql":
+        vector = literal_column("posts.search_vector")
+        tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{word}:*" for word in words))
+        return (
+            query.filter(vector.op("@@")(tsquery))
+            .order_by(None)
+            .order_by(func.ts_rank(vector, tsquery).desc(), models.PostsTable.id)
+        )
+
+    if dialect_name == "sqlite":
+        fts = literal_column("posts_fts")
+        return (
+            query.join(_posts_fts, _posts_fts.c.rowid == models.PostsTable.id)
+            .filter(fts.op("MATCH")(" ".join(f'"{word}"*' for word in words)))
+            .order_by(None)
+            .order_by(func.bm25(fts), models.PostsTable.id)
+        )
+
+    # Unknown backend: unindexed, unranked substring match
+    for word in words:
+        query = query.filter(or_(models.PostsTable.title.contains(word), models.PostsTable.text.contains(word)))
+    return query
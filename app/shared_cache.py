@@ -0,0 +1,137 @@
+"""Cache shared by all gunicorn workers for post reads.
+
+Entries are tagged; invalidating a tag bumps its version counter, and the
+versions of an entry's tags are part of its key, so stale entries are simply
+never read again and age out through their TTL. A miss is computed once: other
+requests in the same worker await it, and other workers wait on a short lock
+in the backend instead of all querying the database at the same time.
+
+Backends (see backends.py): Redis (``redis://``) for deployments, a SQLite
+file (``sqlite:///``) for a single host and for tests.
+"""
+import asyncio
+import logging
+import time
+
+from .backends import backend_from_url
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    def __init__(self, backend, ttl: float, lock_ttl: float, poll_interval: float = 0.05):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+        self.errors = 0
+
+    async def _versioned_key(self, key: str, tags) -> str:
+        versions = await self.backend.get_many([f"tag:{tag}" for tag in tags])
+        return key + "@" + ".".join((version or b"0").decode() for version in versions)
+
+    async def get_or_set(self, key: str, tags, compute) -> bytes:
+        """Return the cached bytes for ``key``, or ``await compute()`` and cache its result."""
+        try:
+            full_key = await self._versioned_key(key, tags)
+            value = (await self.backend.get_many([full_key]))[0]
+        except Exception:
+            self.errors += 1
+            logger.exception("shared cache lookup failed")
+            return await compute()
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._fill(full_key, compute)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[full_key]
+
+    async def _fill(self, full_key: str, compute) -> bytes:
+        lock_key = f"lock:{full_key}"
+        locked = await self._quietly(self.backend.add, lock_key, b"1", self.lock_ttl)
+        if locked is False:
+            # Another worker is computing this entry; wait for it, then fall back to computing it here
+            self.lock_waits += 1
+            deadline = time.monotonic() + self.lock_ttl
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                found = await self._quietly(self.backend.get_many, [full_key])
+                if found and found[0] is not None:
+                    return found[0]
+
+        try:
+            value = await compute()
+        finally:
+            if locked:
+                await self._quietly(self.backend.delete, lock_key)
+        await self._quietly(self.backend.set, full_key, value, self.ttl)
+        return value
+
+    async def _quietly(self, operation, *args):
+        # The database stays the source of truth; a failing cache only costs speed
+        try:
+            return await operation(*args)
+        except Exception:
+            self.errors += 1
+            logger.exception("shared cache %s failed", operation.__name__)
+
+    async def invalidate(self, *tags):
+        for tag in set(tags):
+            await self._quietly(self.backend.incr, f"tag:{tag}")
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "lock_waits": self.lock_waits,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def post_tags(post_id: int, account_id: int) -> list[str]:
+    # A post's own entry, plus the post lists of its owner (the only user who can read it)
+    return [f"post:{post_id}", f"posts:{account_id}"]
+
+
+async def invalidate(*tags):
+    if cache is not None:
+        await cache.invalidate(*tags)
+
+
+cache = (
+    SharedCache(backend_from_url(settings.SHARED_CACHE_URL), settings.SHARED_CACHE_TTL_SECONDS, settings.SHARED_CACHE_LOCK_SECONDS)
+    if settings.SHARED_CACHE_URL
+    else None
+)
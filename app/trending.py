@@ -0,0 +1,127 @@
+"""Trending posts: a materialized, time-decayed ranking in trending_scores.
+
+A vote cast at time t weighs 2 ** ((t - EPOCH) / half-life): instead of every
+score decaying as time passes, newer votes weigh more, which ranks posts
+exactly the same and means a score only changes when its post gets a vote.
+Scores are stored as natural logs of the weighted totals so they never
+overflow; adding a vote is then a log-add-exp in the UPDATE itself. A post
+starts out with the weight of one vote at its creation (``base``). Removing a
+vote takes off the weight it was cast with, from votes.created_at.
+
+Kept up to date by create_post, post imports and every vote path (bump_vote_count,
+apply_votes). Rebuild from the votes table, e.g. after changing
+TRENDING_HALF_LIFE_HOURS, with: python -m app.trending
+"""
+import math
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import Float, case, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import session_local
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+_scores = models.TrendingScore
+
+
+def log_weight(at: float) -> float:
+    """ln of the weight of one vote cast at unix time ``at``."""
+    return (at - EPOCH) * math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def _timestamp(at: datetime) -> float:
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)  # SQLite hands back naive UTC
+    return at.timestamp()
+
+
+def _log_add(a: float, b: float) -> float:
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def _greatest(a, b):
+    return case((a > b, a), else_=b)
+
+
+async def add_posts(db: AsyncSession, post_ids):
+    """Enter new posts into the ranking; does not commit."""
+    weight = log_weight(time.time())
+    await db.execute(insert(_scores), [{"post_id": post_id, "score": weight, "base": weight} for post_id in post_ids])
+
+
+async def add_missing_posts(db: AsyncSession, account_id: int):
+    """Enter the account's posts that have no score yet (bulk imports: COPY returns no ids); does not commit."""
+    weight = literal(log_weight(time.time()), Float)
+    missing = (
+        select(models.PostsTable.id, weight, weight)
+        .outerjoin(_scores, _scores.post_id == models.PostsTable.id)
+        .filter(models.PostsTable.account_id == account_id, _scores.post_id.is_(None))
+    )
+    await db.execute(insert(_scores).from_select(["post_id", "score", "base"], missing))
+
+
+def _total_weights(votes) -> dict:
+    totals = {}
+    for post_id, created_at in votes:
+        totals[post_id] = _log_add(totals.get(post_id, -math.inf), log_weight(_timestamp(created_at)))
+    return totals
+
+
+async def record_votes(db: AsyncSession, added=(), removed=()):
+    """Apply the (post_id, votes.created_at) of votes just added and just removed; does not commit.
+
+    Both sides weigh a vote by its stored created_at, so removing it takes off exactly what adding it put on.
+    """
+    added, removed = _total_weights(added), _total_weights(removed)
+
+    if added:
+        weight = case(added, value=_scores.post_id)
+        # ln(e^score + e^weight), without leaving log space
+        await db.execute(
+            _scores.__table__.update()
+            .where(_scores.post_id.in_(added))
+            .values(score=_greatest(_scores.score, weight) + func.ln(1 + func.exp(-func.abs(_scores.score - weight))))
+        )
+    if removed:
+        # Floating point can leave the difference a hair below base; base is the floor
+        weight = case(removed, value=_scores.post_id)
+        await db.execute(
+            _scores.__table__.update()
+            .where(_scores.post_id.in_(removed))
+            .values(
+                score=case(
+                    (_scores.score - weight > 1e-9, _greatest(_scores.base, _scores.score + func.ln(1 - func.exp(weight - _scores.score)))),
+                    else_=_scores.base,
+                )
+            )
+        )
+
+
+def rebuild(db: Session) -> int:
+    """Rescore every post from its creation time and the times of its votes."""
+    db.execute(delete(_scores))
+    scores = {}
+    for post_id, created_at in db.execute(select(models.PostsTable.id, models.PostsTable.created_at)):
+        scores[post_id] = log_weight(_timestamp(created_at))
+    rows = [{"post_id": post_id, "score": base, "base": base} for post_id, base in scores.items()]
+    for post_id, created_at in db.execute(select(models.Vote.post_id, models.Vote.created_at)).yield_per(10000):
+        scores[post_id] = _log_add(scores[post_id], log_weight(_timestamp(created_at)))
+    for row in rows:
+        row["score"] = scores[row["post_id"]]
+    if rows:
+        db.execute(insert(_scores), rows)
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    db = session_local()
+    try:
+        print(f"rescored {rebuild(db)} post(s)")
+    finally:
+        db.close()
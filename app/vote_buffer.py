@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """Write-behind buffer for votes.
+
+    Votes are acknowledged as soon as they are queued. Repeated add/remove toggles
+    for the same (user_id, post_id) collapse to the last one, and the buffer is
+    written out as one batch when it reaches ``max_size`` or every
+    ``flush_interval`` seconds, whichever comes first. ``close()`` flushes what is
+    left, so a graceful shutdown loses nothing. ``after_flush(db, batch)`` runs
+    once a batch is committed.
+
+    A batch rejected by a constraint (say, the voter was deleted meanwhile) is
+    split until the offending votes are alone; those are dropped and logged.
+    Other failures put the batch back, until a vote has failed ``max_retries``
+    flushes. At ``max_pending`` queued votes ``add()`` refuses more, and the
+    caller writes synchronously instead.
+    """
+
+    def __init__(self, session_factory, apply, max_size: int, flush_interval: float, after_flush=None,
+                 max_pending: int = 10000, max_retries: int = 5):
+        self.session_factory = session_factory
+        self.apply = apply
+        self.after_flush = after_flush
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._pending = {}
+        self._attempts = {}  # (user_id, post_id) -> failed flushes so far
+        self._retry_at = 0.0  # after a failed flush, a full buffer waits for the timer instead of flushing on every add
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
+        self._size_flush = None
+        self.queued = 0
+        self.merged = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flushed_votes = 0
+        self.flush_errors = 0
+        self.dropped_votes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def add(self, user_id: int, post_id: int, vote_option: int) -> bool:
+        """Queue a vote; False when the buffer is full and the vote was not taken."""
+        key = (user_id, post_id)
+        if key in self._pending:
+            self.merged += 1
+        elif len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            return False
+        self._pending[key] = vote_option
+        self.queued += 1
+
+        if (
+            len(self._pending) >= self.max_size
+            and (self._size_flush is None or self._size_flush.done())
+            and time.monotonic() >= self._retry_at
+        ):
+            self._size_flush = asyncio.create_task(self.flush())
+        return True
+
+    async def _write(self, batch: dict):
+        async with self.session_factory() as db:
+            await self.apply(db, batch)
+            await db.commit()
+            if self.after_flush is not None:
+                try:
+                    await self.after_flush(db, batch)
+                except Exception:
+                    # The votes are committed; retrying the batch would not help
+                    logger.exception("vote buffer after_flush failed")
+
+    async def _write_isolating(self, batch: dict):
+        try:
+            await self._write(batch)
+        except IntegrityError:
+            if len(batch) == 1:
+                self.dropped_votes += 1
+                logger.exception("vote buffer dropped vote %s that cannot be written", next(iter(batch)))
+                return
+            # Halve until the bad votes are alone; the rest is written normally
+            items = list(batch.items())
+            await self._write_isolating(dict(items[: len(items) // 2]))
+            await self._write_isolating(dict(items[len(items) // 2 :]))
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+
+            start = time.perf_counter()
+            try:
+                await self._write_isolating(batch)
+            except Exception:
+                # Keep the votes for the next attempt (applying a vote twice is harmless);
+                # anything queued meanwhile is newer and wins
+                self.flush_errors += 1
+                self._retry_at = time.monotonic() + self.flush_interval
+                for key, vote_option in batch.items():
+                    self._attempts[key] = self._attempts.get(key, 0) + 1
+                    if self._attempts[key] >= self.max_retries:
+                        del self._attempts[key]
+                        self.dropped_votes += 1
+                        logger.error("vote buffer dropped vote %s after %d failed flushes", key, self.max_retries)
+                    else:
+                        self._pending.setdefault(key, vote_option)
+                logger.exception("vote buffer flush of %d votes failed", len(batch))
+                return
+
+            for key in batch:
+                self._attempts.pop(key, None)
+            elapsed = time.perf_counter() - start
+            self.flushes += 1
+            self.flushed_votes += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run_timer())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "queued": self.queued,
+            "merged": self.merged,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flushed_votes": self.flushed_votes,
+            "flush_errors": self.flush_errors,
+            "dropped_votes": self.dropped_votes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+        }
@@ -0,0 +1,67 @@
+"""Micro-benchmarks for the hot paths (pytest-benchmark, pinned in requirements-dev.txt).
+
+    pip install -r requirements-dev.txt
+    pytest benchmarks --benchmark-autosave                    # record a baseline in .benchmarks/
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+                                                              # fail if any mean is >10% slower than the last baseline
+
+The query benchmarks seed a throwaway SQLite file by default; set
+BENCH_DATABASE_URL (an async URL, e.g. postgresql+asyncpg://...) to run them
+against an empty Postgres database instead. Its tables are dropped afterwards.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import models
+
+SEED_USERS = 50
+SEED_POSTS_PER_USER = 400
+SEED_VOTES = 20000
+
+
+@pytest.fixture(scope="session")
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def seeded_session_factory(tmp_path_factory, event_loop_runner):
+    url = os.environ.get("BENCH_DATABASE_URL") or f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}"
+    engine = create_async_engine(url, poolclass=NullPool)
+    rng = random.Random(42)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+            await conn.run_sync(models.Base.metadata.create_all)
+            start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+            await conn.execute(
+                insert(models.UsersTable),
+                [{"id": i, "email": f"user{i}@gmail.com", "password": "x", "created_at": start} for i in range(1, SEED_USERS + 1)],
+            )
+            posts = [
+                {"title": f"post {n}", "text": " ".join(rng.choices(["alpha", "beta", "gamma", "delta"], k=20)),
+                 "account_id": n % SEED_USERS + 1, "created_at": start + timedelta(minutes=n)}
+                for n in range(SEED_USERS * SEED_POSTS_PER_USER)
+            ]
+            await conn.execute(insert(models.PostsTable), posts)
+            votes = {(rng.randint(1, SEED_USERS), rng.randint(1, len(posts))) for _ in range(SEED_VOTES)}
+            await conn.execute(insert(models.Vote), [{"user_id": u, "post_id": p} for u, p in votes])
+
+    async def drop():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.drop_all)
+        await engine.dispose()
+
+    event_loop_runner(seed())
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    event_loop_runner(drop())
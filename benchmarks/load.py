@@ -0,0 +1,355 @@
+"""Load generator: replay a request log or run a synthetic traffic mix.
+
+    python benchmarks/load.py --base-url http://localhost:8000 --concurrency 32 --duration 30
+    python benchmarks/load.py --sqlite --rate 200 --duration 30 --mix list=60,get=25,vote=10,create=5
+    python benchmarks/load.py --base-url http://localhost:8000 --replay capture.ndjson --rate 100
+
+--concurrency runs a closed loop (each virtual client sends its next request when
+the previous one returns); --rate opens requests on a fixed schedule whether or
+not earlier ones have finished, which is what exposes queueing.
+
+Virtual users are created and logged in first, so every request carries the
+access_token cookie like the frontend's. --sqlite starts a local instance on a
+throwaway SQLite file (same dependency overrides as the tests) in a separate
+process; otherwise point --base-url at docker-compose or any running server.
+
+The server's rate limits would otherwise end up measuring themselves (all
+virtual users log in from one address, and each sends far more than a person
+would): --sqlite turns them off, and other servers should be started with
+RATE_LIMIT_LOGIN, RATE_LIMIT_POST_READS, RATE_LIMIT_POST_WRITES and
+RATE_LIMIT_VOTES set empty. A 429 during setup stops the run; during the run
+429s are counted under non_2xx.
+
+Replay files are NDJSON, one request per line:
+    {"method": "GET", "path": "/posts?limit=10"}
+    {"method": "POST", "path": "/votes/", "json": {"post_id": "{post_id}", "vote_option": 1}, "user": 3}
+"{post_id}" is replaced by one of the acting user's posts; "user" picks the
+virtual user (default: round robin).
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_MIX = "list=50,get=25,vote=15,create=8,login=2"
+PASSWORD = "load-test-password"
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_of(method: str, url: str) -> str:
+    path = httpx.URL(url).path
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    # Nearest-rank, on an already sorted list
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.failures = defaultdict(int)
+        self.start = self.end = None
+
+    def record(self, route: str, seconds: float, status):
+        self.latencies[route].append(seconds)
+        if status is None:
+            self.failures[route] += 1
+        else:
+            self.statuses[route][status] += 1
+
+    def report(self) -> dict:
+        elapsed = max((self.end or time.perf_counter()) - self.start, 1e-9)
+        rows = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            statuses = self.statuses[route]
+            rows[route] = {
+                "requests": len(values),
+                "rps": len(values) / elapsed,
+                "errors": self.failures[route] + sum(count for status, count in statuses.items() if status >= 500),
+                "non_2xx": sum(count for status, count in statuses.items() if not 200 <= status < 300),
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        all_values = sorted(v for values in self.latencies.values() for v in values)
+        return {
+            "elapsed_seconds": elapsed,
+            "requests": len(all_values),
+            "rps": len(all_values) / elapsed,
+            "p50_ms": percentile(all_values, 0.50) * 1000,
+            "p95_ms": percentile(all_values, 0.95) * 1000,
+            "p99_ms": percentile(all_values, 0.99) * 1000,
+            "routes": rows,
+        }
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.1f}s, {report['rps']:.1f} req/s, "
+          f"p50 {report['p50_ms']:.1f}ms p95 {report['p95_ms']:.1f}ms p99 {report['p99_ms']:.1f}ms")
+    header = f"{'route':32} {'count':>7} {'req/s':>8} {'errors':>7} {'non2xx':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for route, row in report["routes"].items():
+        print(f"{route:32} {row['requests']:>7} {row['rps']:>8.1f} {row['errors']:>7} {row['non_2xx']:>7} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+
+
+def _raise_for_setup(response: httpx.Response):
+    if response.status_code == 429:
+        raise SystemExit(
+            f"{response.request.method} {response.request.url.path} was rate limited during setup; "
+            "start the server with the RATE_LIMIT_* settings empty (see the module docstring)"
+        )
+    response.raise_for_status()
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, email: str):
+        self.email = email
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=30)
+        self.post_ids = []
+        self.voted = set()
+
+    async def setup(self, seed_posts: int):
+        await self.client.post("/users/", json={"email": self.email, "password": PASSWORD})
+        _raise_for_setup(await self.login())
+        for n in range(seed_posts):
+            _raise_for_setup(await self.client.post("/posts/", json={"title": f"seed {n}", "text": "load test post"}))
+        response = await self.client.get("/posts", params={"limit": 100})
+        self.post_ids = [item["post"]["id"] for item in response.json()]
+
+    def login(self):
+        # The response sets the access_token / refresh_token cookies on this client
+        return self.client.post("/login", data={"username": self.email, "password": PASSWORD})
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Synthetic:
+    """Weighted mix of the frontend's main actions."""
+
+    def __init__(self, mix: str, users, rng: random.Random):
+        weights = dict(item.split("=") for item in mix.split(","))
+        unknown = set(weights) - {"list", "get", "vote", "create", "login"}
+        if unknown:
+            raise SystemExit(f"unknown actions in --mix: {', '.join(sorted(unknown))}")
+        self.actions = list(weights)
+        self.weights = [float(weights[action]) for action in self.actions]
+        self.users = users
+        self.rng = rng
+
+    def next(self):
+        user = self.rng.choice(self.users)
+        action = self.rng.choices(self.actions, self.weights)[0]
+        if action == "login":
+            return user, user.login
+        if action == "list":
+            return user, lambda: user.client.get("/posts", params={"limit": 10})
+        if action == "get" and user.post_ids:
+            return user, lambda: user.client.get(f"/posts/{self.rng.choice(user.post_ids)}")
+        if action == "vote":
+            owner = self.rng.choice(self.users)
+            if owner.post_ids:
+                post_id = self.rng.choice(owner.post_ids)
+                option = 0 if post_id in user.voted else 1
+                user.voted.symmetric_difference_update({post_id})
+                return user, lambda: user.client.post("/votes/", json={"post_id": post_id, "vote_option": option})
+        return user, lambda: user.client.post("/posts/", json={"title": "load", "text": "created under load"})
+
+
+class Replay:
+    def __init__(self, path: str, users):
+        with open(path) as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        if not self.records:
+            raise SystemExit(f"{path} has no requests")
+        self.users = users
+        self.position = 0
+
+    def _fill(self, value, user):
+        if value == "{post_id}":
+            return random.choice(user.post_ids)  # a JSON number, not a string
+        if isinstance(value, str):
+            return value.replace("{post_id}", str(random.choice(user.post_ids))) if "{post_id}" in value else value
+        if isinstance(value, dict):
+            return {key: self._fill(item, user) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._fill(item, user) for item in value]
+        return value
+
+    def next(self):
+        record = self.records[self.position % len(self.records)]
+        user = self.users[record.get("user", self.position) % len(self.users)]
+        self.position += 1
+        kwargs = {key: self._fill(record[key], user) for key in ("json", "data", "params") if key in record}
+        path = self._fill(record["path"], user)
+        return user, lambda: user.client.request(record.get("method", "GET"), path, **kwargs)
+
+
+async def _timed(recorder: Recorder, send):
+    start = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.HTTPError as e:
+        recorder.record(route_of(getattr(e.request, "method", "?"), str(getattr(e.request, "url", "/"))), time.perf_counter() - start, None)
+        return
+    recorder.record(route_of(response.request.method, str(response.request.url)), time.perf_counter() - start, response.status_code)
+
+
+async def run_closed(source, recorder: Recorder, concurrency: int, deadline: float, budget: list):
+    async def client():
+        while time.perf_counter() < deadline and budget[0] > 0:
+            budget[0] -= 1
+            _, send = source.next()
+            await _timed(recorder, send)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def run_open(source, recorder: Recorder, rate: float, deadline: float, budget: list, max_in_flight: int):
+    in_flight = set()
+    skipped = 0
+    next_at = time.perf_counter()
+    while time.perf_counter() < deadline and budget[0] > 0:
+        next_at += 1 / rate
+        await asyncio.sleep(max(0, next_at - time.perf_counter()))
+        if len(in_flight) >= max_in_flight:
+            skipped += 1  # the server is not keeping up; don't let the backlog grow without bound
+            continue
+        budget[0] -= 1
+        _, send = source.next()
+        task = asyncio.create_task(_timed(recorder, send))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    await asyncio.gather(*in_flight)
+    if skipped:
+        print(f"warning: {skipped} scheduled requests skipped with {max_in_flight} already in flight", file=sys.stderr)
+
+
+async def main(args):
+    base_url = args.base_url
+    run_id = uuid.uuid4().hex[:8]
+    users = [VirtualUser(base_url, f"load{run_id}.{n}@gmail.com") for n in range(args.users)]
+    try:
+        await asyncio.gather(*(user.setup(args.seed_posts) for user in users))
+        source = Replay(args.replay, users) if args.replay else Synthetic(args.mix, users, random.Random(args.seed))
+
+        recorder = Recorder()
+        recorder.start = time.perf_counter()
+        deadline = recorder.start + args.duration
+        budget = [args.requests or float("inf")]
+        if args.rate:
+            await run_open(source, recorder, args.rate, deadline, budget, args.max_in_flight)
+        else:
+            await run_closed(source, recorder, args.concurrency, deadline, budget)
+        recorder.end = time.perf_counter()
+    finally:
+        await asyncio.gather(*(user.close() for user in users))
+
+    report = recorder.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+def _serve_sqlite(db_path: str, port: int):
+    # Runs in a child process: the app on a SQLite file, wired up the way tests/conftest.py does it.
+    # The limits are parsed when the routers are imported, so they are turned off before that.
+    for name in ("RATE_LIMIT_LOGIN", "RATE_LIMIT_POST_READS", "RATE_LIMIT_POST_WRITES", "RATE_LIMIT_VOTES"):
+        os.environ[name] = ""
+
+    import uvicorn
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.database import Base, get_async_db, get_db
+    from app.main import app
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(engine)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_session_local = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{db_path}", connect_args={"timeout": 30}), autoflush=False, expire_on_commit=False
+    )
+
+    def override_get_db():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_local() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"server at {base_url} did not come up")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay or synthesize traffic and report per-route latency")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--sqlite", action="store_true", help="start a local SQLite-backed instance and load it")
+    parser.add_argument("--port", type=int, default=8765, help="port for --sqlite")
+    parser.add_argument("--replay", help="NDJSON request log to replay instead of the synthetic mix")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"action weights (default: {DEFAULT_MIX})")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=16, help="closed loop with this many clients (default)")
+    load.add_argument("--rate", type=float, help="open loop: requests per second")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="cap for --rate")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed-posts", type=int, default=5, help="posts created per user before the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    server = None
+    if args.sqlite:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        db_path = os.path.join(tempfile.mkdtemp(prefix="load-"), "load.db")
+        server = multiprocessing.Process(target=_serve_sqlite, args=(db_path, args.port))  # not daemonic: the app starts its own Argon2 process pool
+        server.start()
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        _wait_until_up(args.base_url)
+    try:
+        asyncio.run(main(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
@@ -0,0 +1,25 @@
+from jose import jwt
+
+from app import auth, hash_verify
+from app.config import settings
+
+
+def test_create_access_token(benchmark):
+    benchmark(auth.create_access_token, {"user_id": 1})
+
+def test_jwt_decode(benchmark):
+    token = auth.create_access_token({"user_id": 1})
+    benchmark(jwt.decode, token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+def test_decode_user_id_cached(benchmark):
+    token = auth.create_access_token({"user_id": 1})
+    auth._decode_user_id(token)
+    benchmark(auth._decode_user_id, token)
+
+def test_argon2_hash(benchmark):
+    # Configured cost parameters; each round is tens of milliseconds, so keep the count fixed
+    benchmark.pedantic(hash_verify.hash, args=("correct horse",), rounds=10, iterations=1)
+
+def test_argon2_verify(benchmark):
+    hashed = hash_verify.hash("correct horse")
+    benchmark.pedantic(hash_verify.verify, args=("correct horse", hashed), rounds=10, iterations=1)
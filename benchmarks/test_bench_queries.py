@@ -0,0 +1,27 @@
+import pytest
+
+from app.config import settings
+from app.routers import posts
+
+
+@pytest.mark.parametrize("fast", [False, True], ids=["orm", "fast"])
+@pytest.mark.parametrize("limit", [10, 100])
+def test_get_posts_query(benchmark, seeded_session_factory, event_loop_runner, monkeypatch, fast, limit):
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", fast)
+
+    async def page():
+        async with seeded_session_factory() as db:
+            rows, _, _ = await posts._select_posts(db, account_id=7, limit=limit, skip=100, search="", cursor=None)
+            return rows
+
+    rows = benchmark(lambda: event_loop_runner(page()))
+    assert len(rows) == limit
+
+def test_get_posts_search_query(benchmark, seeded_session_factory, event_loop_runner):
+    async def page():
+        async with seeded_session_factory() as db:
+            rows, _, _ = await posts._select_posts(db, account_id=7, limit=10, skip=0, search="alpha gam", cursor=None)
+            return rows
+
+    rows = benchmark(lambda: event_loop_runner(page()))
+    assert rows
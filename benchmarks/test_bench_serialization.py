@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app import models
+from app.routers import posts
+
+
+def orm_items(count):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    account = models.UsersTable(id=1, email="a@gmail.com", created_at=created_at)
+    return [
+        {"post": models.PostsTable(id=i, title=f"post {i}", text="text " * 20, created_at=created_at, account_id=1, account=account), "vote": i % 7, "voted": i % 2 == 0}
+        for i in range(count)
+    ]
+
+def fast_rows(count):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(title=f"post {i}", text="text " * 20, id=i, created_at=created_at, account_id=1,
+                        account_email="a@gmail.com", account_created_at=created_at, vote_count=i % 7)
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("count", [10, 100, 1000])
+def test_post_vote_response_models(benchmark, count):
+    # What response_model=List[PostVoteResponse] does: validate from attributes, then dump to JSON
+    items = orm_items(count)
+    benchmark(lambda: posts._post_vote_list.dump_json(posts._post_vote_list.validate_python(items, from_attributes=True)))
+
+@pytest.mark.parametrize("count", [10, 100, 1000])
+def test_post_vote_response_orjson(benchmark, count):
+    rows = fast_rows(count)
+    benchmark(posts._post_vote_json, rows, set(range(0, count, 2)))
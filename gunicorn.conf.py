@@ -0,0 +1,10 @@
+# Loaded automatically by gunicorn from the working directory (see gunicorn.service)
+import os
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (in-flight requests) of workers that are gone; only with multiprocess metrics on
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -95,12 +95,15 @@
     
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
-from app.database import get_db, Base
+from app.database import get_db, get_async_db, Base
 from app.auth import create_access_token, get_current_user_id
-from app import models
+from app import auth, database, metrics, models, query_log, rate_limit, revocation
+from app.config import settings
 from unittest.mock import Mock
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -111,6 +114,26 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+# NullPool: TestClient runs each request on a fresh event loop, so connections must not be reused
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+metrics.instrument_engine(async_engine.sync_engine)
+query_log.instrument_engine(async_engine.sync_engine)
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    # Ids are reused after every drop_all, so cached users must not leak between tests
+    auth.user_cache.clear()
+    auth.token_cache.clear()
+    revocation.revoked.clear()
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    # Every test client is the same IP and ids repeat, so buckets would carry over between tests
+    rate_limit.limiter.clear()
+
 @pytest.fixture
 def session():
     Base.metadata.drop_all(bind=engine)
@@ -130,7 +153,12 @@ def client(session):
         finally:
             session.close()
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     yield TestClient(app)
     app.dependency_overrides.clear()
 
@@ -199,4 +227,47 @@ def test_posts(test_user, session, test_user_2):
 def test_vote(test_posts, test_user, session):
     new_vote = models.Vote(user_id=test_user["id"], post_id=test_posts[0].id)
     session.add(new_vote)
-    session.commit()
\ No newline at end of file
+    test_posts[0].vote_count += 1
+    session.commit()
+
+@pytest.fixture
+def vote_buffer(monkeypatch):
+    from app.routers import votes
+    from app.vote_buffer import VoteBuffer
+
+    buffer = VoteBuffer(TestingAsyncSessionLocal, votes.apply_votes, max_size=100, flush_interval=60,
+                         after_flush=votes.vote_buffer.after_flush, max_pending=100, max_retries=2)
+    monkeypatch.setattr(votes, "vote_buffer", buffer)
+    monkeypatch.setattr(settings, "VOTE_WRITE_BEHIND", True)
+    return buffer
+
+@pytest.fixture
+def shared_cache(tmp_path, monkeypatch):
+    # SQLite stand-in for Redis; a second SharedCache on the same file behaves like another worker
+    from app import shared_cache as shared_cache_module
+    from app.backends import SQLiteBackend
+    from app.shared_cache import SharedCache
+
+    cache = SharedCache(SQLiteBackend(str(tmp_path / "cache.db")), ttl=30, lock_ttl=5)
+    monkeypatch.setattr(shared_cache_module, "cache", cache)
+    return cache
+
+@pytest.fixture
+def sql_statements():
+    # Every statement the request handlers send through the async engine during the test
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def read_replicas(monkeypatch):
+    # Two "replicas" that are really the test database, so routing can be observed without replication
+    router = database.ReplicaRouter([], balance="round_robin", max_lag=5, check_interval=5)
+    router.replicas = [database.Replica(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool) for _ in range(2)]
+    monkeypatch.setattr(database, "replicas", router)
+    return router
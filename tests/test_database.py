@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+from app import database, query_log
+from app.config import settings
+
+
+def test_pool_stats_track_checkout_waits():
+    engine = create_engine("sqlite://", poolclass=database.TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    conn = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    stats = database.pool_stats(engine)
+    assert stats["checked_out"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["wait_max"] >= 0.05
+    conn.close()
+
+def test_engine_options_pgbouncer(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    options = database.engine_options(is_async=True)
+    assert options["poolclass"] is database.TimedNullPool
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+    assert "pool_size" not in options
+
+def test_engine_options_statement_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    assert database.engine_options(is_async=True)["connect_args"]["server_settings"] == {"statement_timeout": "1500"}
+    assert database.engine_options(is_async=False)["connect_args"]["options"] == "-c statement_timeout=1500"
+
+def test_internal_pool_endpoint(client):
+    response = client.get("/internal/pool")
+    assert response.status_code == 200
+    assert response.json()["async"]["pool"] == "TimedAsyncQueuePool"
+
+def test_normalize_sql():
+    statement = """SELECT posts.id FROM posts
+        WHERE posts.id IN (?, ?, ?) AND posts.title = 'x' AND posts.account_id = $1 LIMIT 10"""
+    assert query_log.normalize(statement) == (
+        "SELECT posts.id FROM posts WHERE posts.id IN (?, ...) AND posts.title = ? AND posts.account_id = $1 LIMIT ?"
+    )
+
+def test_redact_parameters():
+    assert query_log.redact((1, "a@gmail.com", None, b"hash")) == [1, "<str:11>", None, "<bytes:4>"]
+    assert query_log.redact([{"title": "secret", "account_id": 3}]) == [{"title": "<str:6>", "account_id": 3}]
+
+def test_slow_query_logged_with_route_and_plan(authorized_client, test_posts, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 1e-9)
+    monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN", True)
+    with caplog.at_level(logging.WARNING, logger="app.query_log"):
+        assert authorized_client.get("/posts", params={"search": "a"}).status_code == 200
+
+    [record] = [record for record in caplog.records if "FROM posts" in record.getMessage()]
+    message = record.getMessage()
+    assert "route=/posts " in message
+    assert "'<str:" in message  # the search term is redacted
+    assert "plan:" in message
+
+def test_slow_query_log_disabled(authorized_client, test_posts, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.query_log"):
+        authorized_client.get("/posts")
+    assert not caplog.records
+
+def test_sql_debug_header(authorized_client, test_posts, monkeypatch):
+    response = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert "server-timing" not in response.headers
+
+    monkeypatch.setattr(settings, "SQL_DEBUG_HEADER", True)
+    response = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert response.headers["server-timing"].startswith('db;desc="1 statements";dur=')
+
+def test_reads_go_to_replicas_until_a_write(authorized_client, test_posts, read_replicas):
+    authorized_client.get(f"/posts/{test_posts[0].id}")
+    authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert [replica.reads for replica in read_replicas.replicas] == [1, 1]  # round robin
+
+    response = authorized_client.post("/posts/", json={"title": "t", "text": "c"})
+    assert response.status_code == 201
+    assert database.STICKY_COOKIE in response.cookies
+
+    # Read-your-writes: this client's reads now go to the primary, not a replica that may lag
+    assert authorized_client.get("/posts").status_code == 200
+    assert sum(replica.reads for replica in read_replicas.replicas) == 2
+
+def test_reads_fall_back_to_primary(authorized_client, test_posts, read_replicas):
+    read_replicas.replicas[0].healthy = False
+    read_replicas.replicas[1].lag = 60
+    assert authorized_client.get(f"/posts/{test_posts[0].id}").status_code == 200
+    assert sum(replica.reads for replica in read_replicas.replicas) == 0
+    assert read_replicas.fallbacks == 1
+
+def test_least_connections_balance(read_replicas):
+    read_replicas.balance = "least_connections"
+    busy, idle = read_replicas.replicas
+    busy.in_use = 3
+    assert read_replicas.choose() is idle
+    idle.in_use = 5
+    assert read_replicas.choose() is busy
+
+def test_replica_health_check(read_replicas):
+    broken = database.Replica("sqlite+aiosqlite:////nonexistent/dir/replica.db", poolclass=NullPool)
+    read_replicas.replicas.append(broken)
+    asyncio.run(read_replicas.check())
+    assert [replica.healthy for replica in read_replicas.replicas] == [True, True, False]
+    assert read_replicas.replicas[0].lag == 0
@@ -0,0 +1,37 @@
+from prometheus_client import REGISTRY
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_request_latency_and_sql_per_route(authorized_client, test_posts):
+    route = "/posts/{id}"
+    requests = sample("http_request_duration_seconds_count", method="GET", route=route, status="200")
+    statements = sample("http_request_sql_statements_sum", route=route)
+
+    assert authorized_client.get(f"/posts/{test_posts[0].id}").status_code == 200
+
+    assert sample("http_request_duration_seconds_count", method="GET", route=route, status="200") == requests + 1
+    assert sample("http_request_sql_statements_sum", route=route) == statements + 1
+    assert sample("http_request_sql_duration_seconds_count", route=route) >= 1
+    assert sample("http_requests_in_flight", method="GET") == 0
+
+def test_unmatched_routes_share_a_label(client):
+    before = sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+    client.get("/no/such/path")
+    assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == before + 1
+
+def test_argon2_and_jwt_failure_metrics(client, test_user):
+    hashes = sample("argon2_duration_seconds_count", operation="hash")
+    failures = sample("jwt_decode_failures_total", token_type="access", reason="invalid")
+
+    client.post("/users/", json={"email": "m@gmail.com", "password": "123"})
+    client.get("/me", headers={"Authorization": "Bearer not-a-jwt"})
+
+    assert sample("argon2_duration_seconds_count", operation="hash") == hashes + 1
+    assert sample("jwt_decode_failures_total", token_type="access", reason="invalid") == failures + 1
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_bucket" in response.text
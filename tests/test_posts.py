@@ -94,8 +94,11 @@
 #     data = {"title":"0", "text":"0"}
 #     response = authorized_client.put("/posts/1111", json=data)
 #     assert response.status_code == 404
-from app import schemas
+from app import models, schemas
+from app.config import settings
 import pytest
+from sqlalchemy import event
+import json
 
 def test_get_all_posts(authorized_client, test_posts):
     response = authorized_client.get("/posts")  # Changed from "/posts/"
@@ -186,4 +189,257 @@ def test_unauthorized_user_update_post(client, test_user, test_user_2, test_post
 def test_user_update_post_not_exist(authorized_client, test_user, test_posts):
     data = {"title": "0", "text": "0"}
     response = authorized_client.put("/posts/1111", json=data)
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_posts_cursor_pagination(authorized_client, test_user, session):
+    session.add_all([models.PostsTable(title=f"p{i}", text="t", account_id=test_user["id"]) for i in range(5)])
+    session.commit()
+
+    seen = []
+    response = authorized_client.get("/posts", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen += [item["post"]["title"] for item in response.json()]
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        response = authorized_client.get("/posts", params={"limit": 2, "cursor": next_cursor})
+
+    assert seen == ["p0", "p1", "p2", "p3", "p4"]
+
+def test_get_posts_skip_still_supported(authorized_client, test_posts):
+    response = authorized_client.get("/posts", params={"limit": 1, "skip": 1})
+    assert response.status_code == 200
+    assert [item["post"]["id"] for item in response.json()] == [test_posts[1].id]
+
+def test_get_posts_invalid_cursor(authorized_client, test_posts):
+    response = authorized_client.get("/posts", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_search_posts_ranked(authorized_client, test_user, session):
+    session.add_all([
+        models.PostsTable(title="gardening notes", text="tomatoes", account_id=test_user["id"]),
+        models.PostsTable(title="weekly update", text="nothing about plants", account_id=test_user["id"]),
+        models.PostsTable(title="garden party", text="garden garden garden", account_id=test_user["id"]),
+    ])
+    session.commit()
+
+    response = authorized_client.get("/posts", params={"search": "garden"})
+    assert response.status_code == 200
+    titles = [item["post"]["title"] for item in response.json()]
+    assert titles == ["garden party", "gardening notes"]
+
+def test_search_posts_matches_text_and_all_words(authorized_client, test_user, session):
+    session.add_all([
+        models.PostsTable(title="one", text="red apples", account_id=test_user["id"]),
+        models.PostsTable(title="two", text="green apples", account_id=test_user["id"]),
+    ])
+    session.commit()
+
+    response = authorized_client.get("/posts", params={"search": "apple red"})
+    assert [item["post"]["title"] for item in response.json()] == ["one"]
+
+    response = authorized_client.get("/posts", params={"search": "pears"})
+    assert response.json() == []
+
+def test_search_without_words_matches_nothing(authorized_client, test_posts):
+    assert authorized_client.get("/posts", params={"search": "!!"}).json() == []
+    assert len(authorized_client.get("/posts", params={"search": "  "}).json()) == len(authorized_client.get("/posts").json())
+
+def test_search_index_follows_updates(authorized_client, test_posts):
+    authorized_client.put(f"/posts/{test_posts[0].id}", json={"title": "renamed", "text": "fresh words"})
+    response = authorized_client.get("/posts", params={"search": "fresh"})
+    assert [item["post"]["title"] for item in response.json()] == ["renamed"]
+
+@pytest.mark.parametrize("limit", [2, 10])
+def test_fast_post_list_is_byte_identical(authorized_client, test_user, test_posts, session, monkeypatch, limit):
+    session.add_all([
+        models.PostsTable(title='quote " and \\ backslash', text="naïve café — 日本語   \x01", account_id=test_user["id"]),
+        models.PostsTable(title="", text="", account_id=test_user["id"], vote_count=7),
+        models.Vote(user_id=test_user["id"], post_id=test_posts[0].id),
+    ])
+    session.commit()
+
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", False)
+    schema_response = authorized_client.get("/posts", params={"limit": limit})
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", True)
+    fast_response = authorized_client.get("/posts", params={"limit": limit})
+
+    assert fast_response.status_code == schema_response.status_code == 200
+    assert fast_response.headers["content-type"] == schema_response.headers["content-type"]
+    assert fast_response.headers.get("X-Next-Cursor") == schema_response.headers.get("X-Next-Cursor")
+    assert fast_response.content == schema_response.content
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_get_posts_statement_count(authorized_client, test_user, test_user_2, session, sql_statements, monkeypatch, fast):
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", fast)
+    session.add_all([models.PostsTable(title=f"p{i}", text="t", account_id=test_user["id"]) for i in range(20)])
+    session.commit()
+
+    response = authorized_client.get("/posts", params={"limit": 20})
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+    assert len(sql_statements) <= 2  # posts and their authors in one SELECT, the caller's votes in another, however long the page
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_get_posts_voted_flag(authorized_client, test_posts, test_vote, sql_statements, monkeypatch, fast):
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", fast)
+    response = authorized_client.get("/posts")
+    voted = {item["post"]["id"]: item["voted"] for item in response.json()}
+    assert voted == {test_posts[0].id: True, test_posts[1].id: False}
+
+    votes_lookups = [statement for statement, _ in sql_statements if "FROM votes" in statement]
+    assert len(votes_lookups) == 1 and " IN " in votes_lookups[0]
+
+def test_get_post_voted_flag(authorized_client, test_posts):
+    post_id = test_posts[0].id
+    response = authorized_client.get(f"/posts/{post_id}")
+    assert response.json()["voted"] is False
+    etag = response.headers["ETag"]
+
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1})
+    response = authorized_client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["voted"] is True
+
+def test_get_post_statement_count(authorized_client, test_posts, sql_statements):
+    response = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert response.status_code == 200
+    assert response.json()["post"]["account"]["email"] == "a@gmail.com"
+    assert len(sql_statements) <= 1
+
+def test_get_post_etag_not_modified(authorized_client, test_posts):
+    response = authorized_client.get(f"/posts/{test_posts[0].id}")
+    etag = response.headers["ETag"]
+
+    response = authorized_client.get(f"/posts/{test_posts[0].id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+def test_get_post_etag_changes_on_update_and_vote(authorized_client, test_posts):
+    post_id = test_posts[0].id
+    etag = authorized_client.get(f"/posts/{post_id}").headers["ETag"]
+
+    authorized_client.put(f"/posts/{post_id}", json={"title": "new", "text": "new"})
+    response = authorized_client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    etag = response.headers["ETag"]
+
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1})
+    response = authorized_client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["vote"] == 1
+
+def test_get_post_served_from_shared_cache(authorized_client, test_posts, shared_cache, sql_statements):
+    post_id = test_posts[0].id
+    first = authorized_client.get(f"/posts/{post_id}")
+    assert first.status_code == 200
+    sql_statements.clear()
+
+    second = authorized_client.get(f"/posts/{post_id}")
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert sql_statements == []
+    assert shared_cache.hits == 1
+
+    response = authorized_client.get(f"/posts/{post_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+
+def test_shared_cache_matches_uncached_responses(authorized_client, test_posts, shared_cache, monkeypatch):
+    from app import shared_cache as shared_cache_module
+
+    cached = [authorized_client.get("/posts", params={"limit": 1}), authorized_client.get(f"/posts/{test_posts[0].id}")]
+    monkeypatch.setattr(shared_cache_module, "cache", None)
+    uncached = [authorized_client.get("/posts", params={"limit": 1}), authorized_client.get(f"/posts/{test_posts[0].id}")]
+
+    for a, b in zip(cached, uncached):
+        assert a.json() == b.json()
+    assert cached[0].headers["X-Next-Cursor"] == uncached[0].headers["X-Next-Cursor"]
+
+def test_shared_cache_fills_from_the_primary(authorized_client, test_posts, shared_cache, read_replicas):
+    replica_statements = []
+
+    def record(conn, cursor, statement, *args):
+        replica_statements.append(statement)
+
+    for replica in read_replicas.replicas:
+        event.listen(replica.engine.sync_engine, "before_cursor_execute", record)
+
+    assert authorized_client.get("/posts").status_code == 200
+    assert authorized_client.get(f"/posts/{test_posts[0].id}").status_code == 200
+    assert shared_cache.misses == 2
+    assert replica_statements == []
+
+def test_shared_cache_invalidated_by_writes(authorized_client, test_posts, shared_cache):
+    post_id = test_posts[0].id
+    assert len(authorized_client.get("/posts").json()) == 2
+    authorized_client.get(f"/posts/{post_id}")
+
+    authorized_client.post("/posts/", json={"title": "new", "text": "post"})
+    assert len(authorized_client.get("/posts").json()) == 3
+
+    authorized_client.put(f"/posts/{post_id}", json={"title": "changed", "text": "text"})
+    assert authorized_client.get(f"/posts/{post_id}").json()["post"]["title"] == "changed"
+
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1})
+    assert authorized_client.get(f"/posts/{post_id}").json()["vote"] == 1
+    assert {item["post"]["id"]: item["vote"] for item in authorized_client.get("/posts").json()}[post_id] == 1
+
+    authorized_client.delete(f"/posts/{post_id}")
+    assert authorized_client.get(f"/posts/{post_id}").status_code == 404
+    assert len(authorized_client.get("/posts").json()) == 2
+
+def test_export_posts_ndjson(authorized_client, test_user, test_posts, session, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    session.add_all([models.PostsTable(title=f"t{i}", text="x", account_id=test_user["id"]) for i in range(5)])
+    session.commit()
+
+    with authorized_client.stream("GET", "/posts/export") as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert len(rows) == 7  # the other user's post is not exported
+    assert [row["title"] for row in rows[:2]] == ["a", "b"]
+    assert set(rows[0]) == {"id", "title", "text", "created_at", "vote_count"}
+
+def test_export_posts_unauthorized(client, test_posts):
+    assert client.get("/posts/export").status_code == 401
+
+def test_import_posts_ndjson(authorized_client, test_user, session, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+    lines = [
+        json.dumps({"title": "one", "text": "1"}),
+        json.dumps({"title": "two", "text": "2"}),
+        "",
+        "{not json",
+        json.dumps({"title": "three"}),
+        json.dumps({"title": "four", "text": "4"}),
+    ]
+    response = authorized_client.post("/posts/import", files={"file": ("posts.ndjson", "\n".join(lines).encode())})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 3
+    assert report["rejected"] == 2
+    assert [(error["chunk"], error["line"]) for error in report["errors"]] == [(2, 4), (2, 5)]
+
+    titles = {post.title for post in session.query(models.PostsTable).filter(models.PostsTable.account_id == test_user["id"])}
+    assert titles == {"one", "two", "four"}
+    found = authorized_client.get("/posts", params={"search": "four"}).json()
+    assert [item["post"]["title"] for item in found] == ["four"]
+
+def test_import_posts_csv(authorized_client, test_user, session):
+    body = 'title,text\nfirst,"multi\nline"\nsecond,plain\n'
+    response = authorized_client.post("/posts/import", files={"file": ("posts.csv", body.encode())})
+    assert response.json()["imported"] == 2
+    posts = session.query(models.PostsTable).order_by(models.PostsTable.id).all()
+    assert [(post.title, post.text, post.vote_count) for post in posts] == [("first", "multi\nline", 0), ("second", "plain", 0)]
+
+def test_import_posts_csv_missing_column(authorized_client, test_user):
+    response = authorized_client.post("/posts/import", params={"format": "csv"}, files={"file": ("posts.txt", b"title\nonly\n")})
+    report = response.json()
+    assert report["imported"] == 0
+    assert report["rejected"] == 1
+    assert "text" in report["errors"][0]["detail"]
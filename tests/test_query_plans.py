@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from app import models
+from tests.conftest import async_engine
+
+# Statements captured from real requests are re-run under EXPLAIN. On Postgres
+# enable_seqscan=off leaves a sequential scan in the plan only when no index can serve it.
+
+
+def explain_all(statements):
+    async def run():
+        plans = []
+        async with async_engine.connect() as conn:
+            sqlite = conn.dialect.name == "sqlite"
+            if not sqlite:
+                await conn.exec_driver_sql("SET enable_seqscan = off")
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+                rows = (await conn.exec_driver_sql(prefix + statement, tuple(parameters))).all()
+                plans.append((statement, [row[-1] for row in rows]))
+            await conn.rollback()
+        return plans
+    return asyncio.run(run())
+
+def full_scans(plan_lines):
+    # SQLite: "SCAN posts" without an index; Postgres: "Seq Scan on posts"
+    return [
+        line for line in plan_lines
+        if line.startswith("SCAN ") and " USING " not in line and "VIRTUAL TABLE" not in line
+        or "Seq Scan" in line
+    ]
+
+def assert_no_full_scans(statements):
+    plans = explain_all(statements)
+    assert plans
+    for statement, plan in plans:
+        assert not full_scans(plan), f"{statement}\n" + "\n".join(plan)
+
+
+@pytest.fixture
+def seeded(client, test_user, test_user_2, session):
+    posts = [models.PostsTable(title=f"title {i}", text="alpha beta", account_id=test_user["id"] if i % 2 else test_user_2["id"]) for i in range(50)]
+    session.add_all(posts)
+    session.commit()
+    session.add_all([models.Vote(user_id=test_user_2["id"], post_id=post.id) for post in posts[:20]])
+    session.commit()
+    response = client.post("/login", data={"username": test_user["email"], "password": test_user["password"]})
+    assert response.status_code == 200  # client now sends the access_token cookie
+    return [post.id for post in posts if post.account_id == test_user["id"]]
+
+def test_post_queries_use_indexes(client, seeded, sql_statements):
+    response = client.get("/posts", params={"limit": 5})
+    client.get("/posts", params={"limit": 5, "cursor": response.headers["X-Next-Cursor"]})
+    client.get("/posts", params={"search": "alpha"})
+    client.get(f"/posts/{seeded[0]}")
+    client.put(f"/posts/{seeded[0]}", json={"title": "new", "text": "text"})
+    client.delete(f"/posts/{seeded[1]}")
+    with client.stream("GET", "/posts/export") as export:
+        export.read()
+    assert_no_full_scans(sql_statements)
+
+def test_vote_queries_use_indexes(client, seeded, sql_statements):
+    client.post("/votes/", json={"post_id": seeded[0], "vote_option": 1})
+    client.post("/votes/", json={"post_id": seeded[0], "vote_option": 0})
+    client.post("/votes/batch", json=[{"post_id": post_id, "vote_option": 1} for post_id in seeded[:3]])
+    assert_no_full_scans(sql_statements)
+
+def test_auth_queries_use_indexes(client, seeded, test_user, sql_statements):
+    client.post("/login", data={"username": test_user["email"], "password": test_user["password"]})
+    client.get("/me")
+    client.get(f"/users/{test_user['id']}")
+    assert_no_full_scans(sql_statements)
+
+def test_vote_count_lookup_uses_post_id_index(seeded, session):
+    # The reconcile subquery counts votes per post; without ix_votes_post_id it scans votes for every post
+    statement = "SELECT count(votes.post_id) FROM votes WHERE votes.post_id = ?"
+    if session.bind.dialect.name != "sqlite":
+        statement = statement.replace("?", "$1")
+    assert_no_full_scans([(statement, (seeded[0],))])
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app import rate_limit
+from app.config import settings
+from app.main import app
+from app.rate_limit import RateLimiter, parse_rate
+from app.backends import SQLiteBackend
+
+
+def test_parse_rate():
+    assert parse_rate("10/minute") == (6.0, 10)
+    assert parse_rate("") is None
+    with pytest.raises(ValueError):
+        parse_rate("10/fortnight")
+
+def test_login_rate_limited_per_ip(client):
+    interval, burst = parse_rate(settings.RATE_LIMIT_LOGIN)
+    for _ in range(burst):
+        assert client.post("/login", data={"username": "nobody@x.com", "password": "x"}).status_code == 403
+
+    response = client.post("/login", data={"username": "nobody@x.com", "password": "x"})
+    assert response.status_code == 429
+    assert 0 < int(response.headers["Retry-After"]) <= interval + 1
+    assert rate_limit.limiter.rejected >= 1
+
+def test_login_rate_limited_per_forwarded_client(client):
+    # As deployed: nginx (10.0.0.5) in front, uvicorn trusting it with FORWARDED_ALLOW_IPS
+    proxied = TestClient(ProxyHeadersMiddleware(app, trusted_hosts="10.0.0.0/8"), client=("10.0.0.5", 40000))
+    login = {"username": "nobody@x.com", "password": "x"}
+    _, burst = parse_rate(settings.RATE_LIMIT_LOGIN)
+    for _ in range(burst):
+        assert proxied.post("/login", data=login, headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 403
+
+    assert proxied.post("/login", data=login, headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 429
+    assert proxied.post("/login", data=login, headers={"X-Forwarded-For": "203.0.113.8"}).status_code == 403
+
+    # Anyone else's header is ignored, so rotating it does not get around the limit
+    direct = TestClient(ProxyHeadersMiddleware(app, trusted_hosts="10.0.0.0/8"), client=("198.51.100.1", 40000))
+    statuses = [direct.post("/login", data=login, headers={"X-Forwarded-For": f"203.0.113.{i}"}).status_code for i in range(burst + 1)]
+    assert statuses[-1] == 429
+
+def test_token_bucket_refills():
+    limiter = RateLimiter()
+
+    async def scenario():
+        waits = [await limiter.take("k", 0.05, 2) for _ in range(3)]
+        assert waits[:2] == [0, 0] and waits[2] > 0
+        assert await limiter.take("other", 0.05, 2) == 0  # buckets are per key
+        await asyncio.sleep(0.06)
+        assert await limiter.take("k", 0.05, 2) == 0
+
+    asyncio.run(scenario())
+    assert limiter.rejected == 1
+
+def test_shared_backend_limits_across_workers(tmp_path):
+    path = str(tmp_path / "limits.db")
+    worker_1, worker_2 = RateLimiter(SQLiteBackend(path)), RateLimiter(SQLiteBackend(path))
+
+    async def scenario():
+        results = [await worker.take("user:1", 60, 3) for worker in (worker_1, worker_2, worker_1, worker_2)]
+        assert [wait == 0 for wait in results] == [True, True, True, False]
+        assert 0 < results[-1] <= 60
+
+    asyncio.run(scenario())
+
+def test_local_bucket_rejects_without_backend_round_trip():
+    class CountingBackend:
+        calls = 0
+
+        async def eval(self, script, keys, *args):
+            self.calls += 1
+            return "0"
+
+    backend = CountingBackend()
+    limiter = RateLimiter(backend)
+
+    async def scenario():
+        return [await limiter.take("k", 60, 2) for _ in range(5)]
+
+    assert [wait == 0 for wait in asyncio.run(scenario())] == [True, True, False, False, False]
+    assert backend.calls == 2
+
+def test_post_imports_share_the_post_write_limit(authorized_client):
+    interval, burst = parse_rate(settings.RATE_LIMIT_POST_WRITES)
+    for i in range(burst):
+        assert authorized_client.post("/posts/", json={"title": f"t{i}", "text": "x"}).status_code == 201
+
+    response = authorized_client.post("/posts/import", files={"file": ("posts.ndjson", b'{"title": "a", "text": "b"}')})
+    assert response.status_code == 429
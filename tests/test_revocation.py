@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from app import revocation
+from app.revocation import BloomFilter, RevocationList, RevocationSync
+from app.backends import SQLiteBackend
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [uuid.uuid4().hex for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
+
+def test_revocation_list_forgets_expired_tokens():
+    revoked = RevocationList(capacity=10)
+    revoked.add("live", time.time() + 60)
+    revoked.add("expiring", time.time() + 0.05)
+    revoked.add("expired", time.time() - 1)
+    assert "live" in revoked and "expiring" in revoked and "expired" not in revoked
+
+    time.sleep(0.1)
+    revoked.purge()
+    assert "expiring" not in revoked
+    assert len(revoked) == 1
+
+def test_revocation_list_grows_past_capacity():
+    revoked = RevocationList(capacity=4)
+    jtis = [uuid.uuid4().hex for _ in range(20)]
+    for jti in jtis:
+        revoked.add(jti, time.time() + 60)
+
+    assert all(jti in revoked for jti in jtis)
+    assert revoked.capacity >= 20
+
+def test_revocations_reach_other_workers(tmp_path):
+    path = str(tmp_path / "revoked.db")
+    worker_1 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+    worker_2 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+
+    async def scenario():
+        worker_1.revoked.add("a", time.time() + 60)
+        await worker_1.publish("a", time.time() + 60)
+        await worker_1.publish("b", time.time() + 60)
+        await worker_2.pull()
+        assert "a" in worker_2.revoked and "b" in worker_2.revoked
+
+        await worker_1.publish("c", time.time() + 60)
+        await worker_2.pull()
+        assert "c" in worker_2.revoked
+        assert worker_2.seen == 3
+        await worker_1.close()
+        await worker_2.close()
+
+    asyncio.run(scenario())
+
+def test_pull_during_publish_does_not_skip_the_entry(tmp_path, monkeypatch):
+    path = str(tmp_path / "revoked.db")
+    worker_1 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+    worker_2 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+    numbered, resume = threading.Event(), threading.Event()
+    publish = revocation._publish_sqlite
+
+    def publish_slowly(conn, *args):
+        seq = publish(conn, *args)
+        numbered.set()  # the sequence number is taken, the transaction still open
+        resume.wait(5)
+        return seq
+
+    monkeypatch.setattr(revocation, "_publish_sqlite", publish_slowly)
+
+    async def scenario():
+        publishing = asyncio.create_task(worker_1.publish("a", time.time() + 60))
+        await asyncio.to_thread(numbered.wait, 5)
+        await worker_2.pull()
+        assert worker_2.seen == 0
+        resume.set()
+        await publishing
+
+        await worker_2.pull()
+        assert "a" in worker_2.revoked
+        await worker_1.close()
+        await worker_2.close()
+
+    asyncio.run(scenario())
+
+def test_startup_pull_starts_at_the_low_water_mark(tmp_path):
+    path = str(tmp_path / "revoked.db")
+    worker_1 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+
+    async def scenario():
+        for i in range(3):
+            await worker_1.publish(f"short{i}", time.time() + 0.05)
+        await worker_1.publish("long", time.time() + 60)
+        await asyncio.sleep(0.1)
+        await worker_1.pull()  # the first pull moves the mark past the expired entries
+        assert (await worker_1.backend.get_many(["revoked:low"]))[0] == b"4"
+
+        worker_2 = RevocationSync(SQLiteBackend(path), RevocationList(capacity=10), interval=1)
+        reads = []
+        get_many = worker_2.backend.get_many
+
+        async def counting_get_many(keys):
+            reads.extend(keys)
+            return await get_many(keys)
+
+        worker_2.backend.get_many = counting_get_many
+        await worker_2.pull()
+        assert "long" in worker_2.revoked
+        assert "revoked:1" not in reads
+        await worker_1.close()
+        await worker_2.close()
+
+    asyncio.run(scenario())
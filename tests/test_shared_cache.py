@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from app.backends import SQLiteBackend
+from app.shared_cache import SharedCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return SharedCache(SQLiteBackend(str(tmp_path / "cache.db")), ttl=30, lock_ttl=kwargs.pop("lock_ttl", 5), **kwargs)
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    worker_1, worker_2 = make_cache(tmp_path), make_cache(tmp_path)
+
+    async def scenario():
+        async def compute():
+            return b"v1"
+        assert await worker_1.get_or_set("post:1", ["post:1"], compute) == b"v1"
+
+        async def must_not_run():
+            raise AssertionError("should be served from the shared cache")
+        assert await worker_2.get_or_set("post:1", ["post:1"], must_not_run) == b"v1"
+
+        await worker_2.invalidate("post:1")
+
+        async def compute_v2():
+            return b"v2"
+        assert await worker_1.get_or_set("post:1", ["post:1"], compute_v2) == b"v2"
+
+    asyncio.run(scenario())
+
+def test_concurrent_misses_compute_once(tmp_path):
+    worker_1, worker_2 = make_cache(tmp_path, poll_interval=0.01), make_cache(tmp_path, poll_interval=0.01)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return b"value"
+
+    async def scenario():
+        return await asyncio.gather(*(worker.get_or_set("posts:1", ["posts:1"], compute) for worker in [worker_1, worker_2] * 5))
+
+    assert asyncio.run(scenario()) == [b"value"] * 10
+    assert calls == 1
+    assert worker_1.coalesced + worker_2.coalesced == 8
+    assert worker_1.lock_waits + worker_2.lock_waits == 1
+
+def test_errors_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def failing():
+        raise ValueError("boom")
+
+    async def compute():
+        return b"ok"
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await cache.get_or_set("post:2", ["post:2"], failing)
+        return await cache.get_or_set("post:2", ["post:2"], compute)
+
+    assert asyncio.run(scenario()) == b"ok"
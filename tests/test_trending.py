@@ -0,0 +1,94 @@
+import base64
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app import models, trending
+from app.config import settings
+
+
+@pytest.fixture
+def ranked_posts(test_posts, session):
+    # The fixture posts are inserted directly, so score them the way a migration or rescore would
+    trending.rebuild(session)
+    return test_posts
+
+def trending_ids(client, **params):
+    response = client.get("/posts/trending", params=params)
+    assert response.status_code == 200
+    return [item["post"]["id"] for item in response.json()]
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_votes_raise_a_post(authorized_client, ranked_posts, monkeypatch, fast):
+    monkeypatch.setattr(settings, "FAST_POST_LISTS", fast)
+    oldest = ranked_posts[0]
+    assert len(trending_ids(authorized_client)) == 3
+
+    authorized_client.post("/votes/", json={"post_id": oldest.id, "vote_option": 1})
+    response = authorized_client.get("/posts/trending")
+    assert response.json()[0]["post"]["id"] == oldest.id
+    assert response.json()[0]["vote"] == 1
+    assert [item["voted"] for item in response.json()] == [True, False, False]
+
+def test_new_post_is_ranked(authorized_client, ranked_posts, session):
+    assert authorized_client.post("/posts/", json={"title": "new", "text": "post"}).status_code == 201
+    newest = session.query(models.PostsTable).filter_by(title="new").one()
+    # Same vote count as everything else, but its one implicit vote is the most recent
+    assert trending_ids(authorized_client)[0] == newest.id
+
+def test_removing_a_vote_restores_the_base_score(authorized_client, ranked_posts, session):
+    post_id = ranked_posts[2].id
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1})
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 0})
+
+    row = session.get(models.TrendingScore, post_id)
+    session.refresh(row)
+    assert row.score == pytest.approx(row.base, abs=1e-6)
+
+def test_removing_an_old_vote_takes_off_its_own_weight(authorized_client, test_posts, test_user, test_user_2, session):
+    post = test_posts[0]
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    voted_at = now - timedelta(days=5)
+    post.created_at = now - timedelta(days=10)
+    third = models.UsersTable(email="third@gmail.com", password="x")
+    session.add(third)
+    session.flush()
+    session.add_all(
+        models.Vote(user_id=user_id, post_id=post.id, created_at=voted_at) for user_id in (test_user["id"], test_user_2["id"], third.id)
+    )
+    session.commit()
+    trending.rebuild(session)
+
+    assert authorized_client.post("/votes/", json={"post_id": post.id, "vote_option": 0}).status_code == 201
+
+    row = session.get(models.TrendingScore, post.id)
+    session.refresh(row)
+    # Two votes from five days ago are left; one cast now would have weighed 32 times more
+    vote_weight = trending.log_weight(voted_at.timestamp())
+    assert row.score == pytest.approx(row.base + math.log1p(2 * math.exp(vote_weight - row.base)))
+
+def test_batch_votes_update_scores(authorized_client, ranked_posts):
+    last = ranked_posts[2].id
+    response = authorized_client.post("/votes/batch", json=[{"post_id": last, "vote_option": 1}])
+    assert response.json()[0]["status"] == "added"
+    assert trending_ids(authorized_client)[0] == last
+
+def test_trending_cursor_pagination(authorized_client, ranked_posts):
+    first = authorized_client.get("/posts/trending", params={"limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    rest = trending_ids(authorized_client, limit=2, cursor=cursor)
+
+    ids = [item["post"]["id"] for item in first.json()] + rest
+    assert sorted(ids) == sorted(post.id for post in ranked_posts)
+
+def test_trending_invalid_cursor(authorized_client, ranked_posts):
+    cursor = base64.urlsafe_b64encode(json.dumps(["x"]).encode()).decode()
+    assert authorized_client.get("/posts/trending", params={"cursor": cursor}).status_code == 400
+
+def test_rebuild_ranks_by_votes_then_age(session, test_posts, test_vote):
+    assert trending.rebuild(session) == 3
+    scores = {row.post_id: row.score for row in session.query(models.TrendingScore)}
+    voted, _, newest = (post.id for post in test_posts)
+    # One vote outweighs being created a moment later
+    assert scores[voted] > scores[newest]
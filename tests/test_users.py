@@ -1,5 +1,5 @@
 import pytest
-from app import schemas
+from app import auth, hash_verify, models, schemas
 from jose import jwt
 from app.config import settings
 
@@ -37,3 +37,107 @@ def test_incorrect_login_user(client, test_user, email, password, status_code):
     # assert response.json().get(""detail) == "Invalid Credentials"
 
 
+
+
+def test_current_user_served_from_cache(client, test_user, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me", headers=headers).status_code == 200
+    misses, hits = auth.user_cache.misses, auth.user_cache.hits
+
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == test_user["email"]
+    assert auth.user_cache.misses == misses
+    assert auth.user_cache.hits == hits + 1
+
+def test_user_cache_invalidated_on_delete(client, test_user, token, session):
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me", headers=headers).status_code == 200
+
+    session.delete(session.get(models.UsersTable, test_user["id"]))
+    session.commit()
+
+    assert client.get("/me", headers=headers).status_code == 401
+
+def test_invalid_token_rejected(client, test_user):
+    response = client.get("/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+
+def test_concurrent_user_updates_do_not_conflict(session, test_user):
+    # Two logins rehashing the same outdated password at once: the last write wins, neither fails
+    from tests.conftest import TestingSessionLocal
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        users = [db.get(models.UsersTable, test_user["id"]) for db in (first, second)]
+        for db, user, password in zip((first, second), users, ("hash-1", "hash-2")):
+            user.password = password
+            db.commit()
+    finally:
+        first.close()
+        second.close()
+    session.expire_all()
+    assert session.get(models.UsersTable, test_user["id"]).password == "hash-2"
+
+def test_logout_revokes_cached_token(client, test_user, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me", headers=headers).status_code == 200
+
+    assert client.post("/logout", headers=headers).status_code == 200
+    assert client.get("/me", headers=headers).status_code == 401
+
+def test_refresh_rotates_refresh_token(client, test_user):
+    client.post("/login", data={"username": test_user["email"], "password": test_user["password"]})
+    old_refresh = client.cookies.get("refresh_token")
+
+    response = client.post("/refresh")
+    assert response.status_code == 200
+    assert client.cookies.get("refresh_token") != old_refresh
+    assert client.get("/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"}).status_code == 200
+
+    # Replaying the old refresh token fails; the new one still works
+    new_refresh = client.cookies.get("refresh_token")
+    client.cookies.set("refresh_token", old_refresh)
+    assert client.post("/refresh").status_code == 401
+    client.cookies.set("refresh_token", new_refresh)
+    assert client.post("/refresh").status_code == 200
+
+def test_login_rehashes_outdated_password(client, session):
+    from passlib.context import CryptContext
+    old_context = CryptContext(schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=8192, argon2__parallelism=1)
+    user = models.UsersTable(email="old@gmail.com", password=old_context.hash("123"))
+    session.add(user)
+    session.commit()
+    assert hash_verify.needs_update(user.password)
+
+    response = client.post("/login", data={"username": "old@gmail.com", "password": "123"})
+    assert response.status_code == 200
+
+    session.refresh(user)
+    assert not hash_verify.needs_update(user.password)
+    assert hash_verify.verify("123", user.password)
+
+def test_hash_pool_saturated(client, monkeypatch):
+    monkeypatch.setattr(settings, "HASH_QUEUE_LIMIT", 0)
+    response = client.post("/users/", json={"email": "busy@gmail.com", "password": "123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_get_user_etag(client, test_user, session):
+    response = client.get(f"/users/{test_user['id']}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/users/{test_user['id']}", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+    user = session.get(models.UsersTable, test_user["id"])
+    user.email = "changed@gmail.com"
+    session.commit()
+
+    response = client.get(f"/users/{test_user['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["email"] == "changed@gmail.com"
+
+def test_hash_pool_is_not_forked_from_the_worker():
+    # The worker has threads by the time the pool starts; see hash_verify._START_METHOD
+    assert hash_verify._get_pool()._mp_context.get_start_method() != "fork"
@@ -1,3 +1,11 @@
+import asyncio
+
+from sqlalchemy.exc import IntegrityError
+
+from app import http_cache, models
+from app.config import settings
+from app.reconcile import reconcile_vote_counts
+
 def test_vote_post(authorized_client, test_posts):
     response = authorized_client.post("/votes/", json={"post_id":test_posts[0].id, "vote_option":1})
     assert response.status_code == 201
@@ -22,4 +30,174 @@ def test_vote_post_that_not_exist(authorized_client, test_posts, test_vote):
 
 def test_vote_post_unauthorized_user(client, test_posts):    
     response = client.post("/votes/", json={"post_id":test_posts[0].id, "vote_option":1})
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_vote_updates_vote_count(authorized_client, test_posts):
+    post_id = test_posts[0].id
+    authorized_client.post("/votes/", json={"post_id":post_id, "vote_option":1})
+    response = authorized_client.get(f"/posts/{post_id}")
+    assert response.json()["vote"] == 1
+
+    authorized_client.post("/votes/", json={"post_id":post_id, "vote_option":0})
+    response = authorized_client.get(f"/posts/{post_id}")
+    assert response.json()["vote"] == 0
+
+
+def test_reconcile_vote_counts(session, test_posts, test_vote):
+    test_posts[0].vote_count = 5
+    test_posts[1].vote_count = 2
+    session.commit()
+
+    assert reconcile_vote_counts(session) == 2
+    session.refresh(test_posts[0])
+    session.refresh(test_posts[1])
+    assert test_posts[0].vote_count == 1
+    assert test_posts[1].vote_count == 0
+
+
+def test_vote_batch(authorized_client, test_posts, test_vote, session):
+    post_ids = [post.id for post in test_posts]
+    response = authorized_client.post("/votes/batch", json=[
+        {"post_id": post_ids[0], "vote_option": 1},
+        {"post_id": post_ids[1], "vote_option": 0},
+        {"post_id": post_ids[1], "vote_option": 1},
+        {"post_id": post_ids[2], "vote_option": 0},
+        {"post_id": 11111, "vote_option": 1},
+    ])
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == ["conflict", "superseded", "added", "not_found", "not_found"]
+
+    session.expire_all()
+    assert [session.get(models.PostsTable, post_id).vote_count for post_id in post_ids] == [1, 1, 0]
+
+def test_vote_batch_remove(authorized_client, test_posts, test_vote, session):
+    post_id = test_posts[0].id
+    response = authorized_client.post("/votes/batch", json=[{"post_id": post_id, "vote_option": 0}])
+    assert response.json()[0]["status"] == "deleted"
+
+    session.expire_all()
+    assert session.get(models.PostsTable, post_id).vote_count == 0
+    assert session.query(models.Vote).count() == 0
+
+def test_vote_batch_too_large(authorized_client, test_posts):
+    votes = [{"post_id": test_posts[0].id, "vote_option": 1}] * (settings.VOTE_BATCH_MAX_SIZE + 1)
+    response = authorized_client.post("/votes/batch", json=votes)
+    assert response.status_code == 422
+
+
+def test_write_behind_votes_coalesce(authorized_client, test_posts, vote_buffer, session):
+    post_id = test_posts[0].id
+    for option in (1, 0, 1):
+        response = authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": option})
+        assert response.status_code == 202
+
+    assert len(vote_buffer) == 1
+    assert vote_buffer.merged == 2
+    assert session.query(models.Vote).count() == 0
+
+    asyncio.run(vote_buffer.close())
+
+    session.expire_all()
+    assert session.query(models.Vote).count() == 1
+    assert session.get(models.PostsTable, post_id).vote_count == 1
+    assert vote_buffer.stats()["flushes"] == 1
+    assert vote_buffer.stats()["depth"] == 0
+
+def test_write_behind_flushes_when_full(test_posts, test_user, vote_buffer, session):
+    vote_buffer.max_size = 2
+    post_ids = [post.id for post in test_posts]
+
+    async def vote_twice():
+        vote_buffer.add(test_user["id"], post_ids[0], 1)
+        vote_buffer.add(test_user["id"], post_ids[1], 1)
+        await vote_buffer._size_flush
+
+    asyncio.run(vote_twice())
+    assert len(vote_buffer) == 0
+    assert session.query(models.Vote).count() == 2
+
+def test_write_behind_drops_only_unwritable_votes(test_posts, test_user, test_user_2, vote_buffer, session):
+    post_ids = [post.id for post in test_posts]
+    apply = vote_buffer.apply
+
+    async def apply_rejecting_user2(db, batch):
+        if any(user_id == test_user_2["id"] for user_id, _ in batch):
+            raise IntegrityError("INSERT INTO votes", {}, Exception("voter was deleted"))
+        await apply(db, batch)
+
+    vote_buffer.apply = apply_rejecting_user2
+    for post_id in post_ids[:3]:
+        vote_buffer.add(test_user["id"], post_id, 1)
+    vote_buffer.add(test_user_2["id"], post_ids[0], 1)
+
+    asyncio.run(vote_buffer.flush())
+    assert len(vote_buffer) == 0
+    assert session.query(models.Vote).count() == 3
+    assert vote_buffer.stats()["dropped_votes"] == 1
+
+def test_write_behind_gives_up_after_max_retries(test_posts, test_user, vote_buffer, session):
+    async def broken(db, batch):
+        raise ConnectionError("database is down")
+
+    vote_buffer.apply = broken
+    vote_buffer.add(test_user["id"], test_posts[0].id, 1)
+
+    asyncio.run(vote_buffer.flush())
+    assert len(vote_buffer) == 1  # kept for the next flush
+    asyncio.run(vote_buffer.flush())
+    assert len(vote_buffer) == 0
+    assert vote_buffer.stats()["flush_errors"] == 2
+    assert vote_buffer.stats()["dropped_votes"] == 1
+
+def test_write_behind_full_buffer_writes_synchronously(authorized_client, test_posts, test_user_2, vote_buffer, session):
+    vote_buffer.max_pending = 1
+    vote_buffer.add(test_user_2["id"], test_posts[1].id, 1)
+
+    response = authorized_client.post("/votes/", json={"post_id": test_posts[0].id, "vote_option": 1})
+    assert response.status_code == 201
+    assert session.query(models.Vote).count() == 1
+    assert len(vote_buffer) == 1
+    assert vote_buffer.stats()["rejected"] == 1
+
+def test_vote_refreshes_owners_proxy_cache_after_commit(authorized_client, test_posts, monkeypatch):
+    purged = []
+
+    async def purge(request_headers, *paths):
+        purged.extend(paths)
+
+    monkeypatch.setattr(http_cache, "purge", purge)
+    post_id = test_posts[0].id
+    assert authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1}).status_code == 201
+    assert purged == [f"/posts/{post_id}"]
+
+def test_write_behind_vote_does_not_refresh_proxy_cache(authorized_client, test_posts, vote_buffer, monkeypatch):
+    purged = []
+
+    async def purge(request_headers, *paths):
+        purged.extend(paths)
+
+    monkeypatch.setattr(http_cache, "purge", purge)
+    assert authorized_client.post("/votes/", json={"post_id": test_posts[0].id, "vote_option": 1}).status_code == 202
+    assert purged == []
+
+def test_write_behind_still_validates_post(authorized_client, test_posts, vote_buffer):
+    response = authorized_client.post("/votes/", json={"post_id": 11111, "vote_option": 1})
+    assert response.status_code == 404
+    assert len(vote_buffer) == 0
+
+def test_write_behind_flush_invalidates_shared_cache(authorized_client, test_posts, vote_buffer, shared_cache):
+    post_id = test_posts[0].id
+    assert authorized_client.get(f"/posts/{post_id}").json()["vote"] == 0
+
+    authorized_client.post("/votes/", json={"post_id": post_id, "vote_option": 1})
+    assert authorized_client.get(f"/posts/{post_id}").json()["vote"] == 0  # not written yet
+
+    asyncio.run(vote_buffer.flush())
+    assert authorized_client.get(f"/posts/{post_id}").json()["vote"] == 1
+
+def test_vote_batch_invalidates_shared_cache(authorized_client, test_posts, shared_cache):
+    post_id = test_posts[0].id
+    assert authorized_client.get("/posts").json()[0]["vote"] == 0
+
+    authorized_client.post("/votes/batch", json=[{"post_id": post_id, "vote_option": 1}])
+    assert authorized_client.get("/posts").json()[0]["vote"] == 1